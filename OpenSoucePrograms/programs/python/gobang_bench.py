@@ -0,0 +1,237 @@
+"""引擎热点基准测试：固定局面、固定种子，可以保存基线并与基线比较找出性能回退"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from gobang_engine import (BOARD_SIZE, DIRECTIONS, NUMPY_AVAILABLE, Engine, check_win, evaluate_position,
+                           get_candidate_moves, get_line_pattern, get_valid_moves, perft)
+
+# 固定局面：黑先，黑白交替落子；都至少6子且没有一步成五或必须堵的点，get_ai_move一定会进入搜索
+POSITIONS = {
+    'opening': [(7, 7), (7, 8), (8, 8), (6, 6), (8, 6), (9, 9)],
+    'midgame': [(7, 7), (7, 8), (8, 9), (6, 6), (9, 6), (10, 10), (5, 8), (8, 4), (4, 5), (10, 8),
+                (6, 11), (3, 3)],
+    'endgame': [(7, 7), (8, 8), (6, 8), (5, 9), (6, 7), (7, 9), (5, 7), (8, 7), (4, 7), (3, 7),
+                (6, 6), (6, 9), (8, 9), (4, 9), (3, 9), (4, 8), (6, 10), (2, 6), (1, 5), (7, 8),
+                (5, 10), (9, 6), (10, 5), (6, 5), (7, 10), (4, 10), (8, 10), (9, 10), (4, 11), (9, 8),
+                (7, 6), (11, 8), (10, 8), (10, 9)],
+}
+
+BENCH_SEED = 20240615
+REPEATS = 5           # 每项重复次数，取最快的一次
+BENCH_DEPTH = 3      # negamax测速使用的固定深度
+PERFT_DEPTH = 3      # perft展开的层数
+REGRESSION_THRESHOLD = 0.10  # 比基线差10%以上视为回退
+MIN_TIME = 0.05       # 微基准每次至少跑这么多秒，避免计时精度的影响
+
+def make_engine(position, board_size=BOARD_SIZE):
+    """为局面创建一个不限时、固定种子、不用开局库的引擎，对局面本身没有随机性；大棋盘上局面整体平移到中央"""
+    engine = Engine(time_limit=float('inf'), seed=BENCH_SEED, threat_time_limit=float('inf'),
+                    book_path=None, board_size=board_size)
+    offset = (board_size - BOARD_SIZE) // 2
+    for i, (row, col) in enumerate(POSITIONS[position]):
+        engine.board.place(row + offset, col + offset, 'black' if i % 2 == 0 else 'white')
+    return engine
+
+def side_to_move(position):
+    """轮到哪一方走"""
+    return 'black' if len(POSITIONS[position]) % 2 == 0 else 'white'
+
+def bench_line_pattern(engine):
+    """所有空位、四个方向、双方的棋型查询"""
+    board = engine.board
+    ops = 0
+    for row, col in get_valid_moves(board):
+        for dx, dy in DIRECTIONS:
+            get_line_pattern(board, row, col, dx, dy, 'black')
+            get_line_pattern(board, row, col, dx, dy, 'white')
+            ops += 2
+    return ops, 0
+
+def bench_evaluate_position(engine):
+    """所有候选点的位置评估，权重的随机数用固定种子"""
+    board = engine.board
+    rng = random.Random(BENCH_SEED)
+    ops = 0
+    for row, col in get_valid_moves(board):
+        evaluate_position(board, row, col, 'black', rng)
+        evaluate_position(board, row, col, 'white', rng)
+        ops += 2
+    return ops, 0
+
+def bench_candidate_moves(engine, vectorized=False):
+    """候选点生成与评估，权重的随机数用固定种子"""
+    board = engine.board
+    rng = random.Random(BENCH_SEED)
+    for _ in range(10):
+        get_candidate_moves(board, 'black', rng, vectorized)
+        get_candidate_moves(board, 'white', rng, vectorized)
+    return 20, 0
+
+def bench_valid_moves(engine):
+    """生成候选点"""
+    board = engine.board
+    for _ in range(100):
+        get_valid_moves(board)
+    return 100, 0
+
+def bench_check_win(engine):
+    """对盘上每个棋子判断胜负"""
+    board = engine.board
+    stones = [divmod(index, board.size) for index in board.moves]
+    for row, col in stones:
+        check_win(board, row, col)
+    return len(stones), 0
+
+def bench_perft(engine):
+    """沿着法生成器展开固定层数，测落子、提子和着法生成的速度"""
+    board = engine.board
+    return 1, perft(board, PERFT_DEPTH, 'black' if board.count % 2 == 0 else 'white')
+
+def bench_negamax(engine):
+    """固定深度的主要变例搜索"""
+    engine.reset_search_stats()
+    engine.negamax(BENCH_DEPTH, float('-inf'), float('inf'), 'white' if engine.board.count % 2 else 'black')
+    return 1, engine.search_stats['nodes']
+
+def bench_ai_move(engine, position):
+    """完整的AI决策：算杀加不限时的固定深度迭代加深"""
+    engine.max_depth = BENCH_DEPTH
+    engine.get_ai_move(side_to_move(position))
+    if not engine.search_stats['nodes']:
+        raise ValueError(f'get_ai_move did not search on {position}')
+    return 1, engine.search_stats['nodes'] + engine.search_stats['threat_nodes']
+
+# 搜索类基准会改写置换表和历史表，每次都要从新引擎开始，不能在同一个引擎上循环
+SEARCH_BENCHMARKS = ('negamax', 'get_ai_move')
+
+BENCHMARKS = {
+    'get_line_pattern': bench_line_pattern,
+    'evaluate_position': bench_evaluate_position,
+    'get_candidate_moves': bench_candidate_moves,
+    'get_valid_moves': bench_valid_moves,
+    'check_win': bench_check_win,
+    'perft': bench_perft,
+    'negamax': bench_negamax,
+    'get_ai_move': bench_ai_move,
+}
+# 装有NumPy时另测批量评估的版本
+if NUMPY_AVAILABLE:
+    BENCHMARKS['get_candidate_moves_numpy'] = lambda engine: bench_candidate_moves(engine, vectorized=True)
+
+def run_once(name, position, trace=False, board_size=BOARD_SIZE):
+    """跑一次基准，返回(操作数, 结点数, 秒数, 峰值字节数)；累计运行至少MIN_TIME秒"""
+    function = BENCHMARKS[name]
+    ops = nodes = 0
+    seconds = 0.0
+    engine = None
+    base = 0
+    if trace:
+        tracemalloc.start()
+    while True:
+        if engine is None or name in SEARCH_BENCHMARKS:
+            engine = make_engine(position, board_size)
+            if trace:
+                # 只统计基准本身的分配，不算新建棋盘占用的内存
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+        args = (engine, position) if name == 'get_ai_move' else (engine,)
+        start = time.perf_counter()
+        run_ops, run_nodes = function(*args)
+        seconds += time.perf_counter() - start
+        ops += run_ops
+        nodes += run_nodes
+        if seconds >= MIN_TIME or trace:
+            break
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+    return ops, nodes, seconds, peak
+
+def measure(name, position, repeats=REPEATS, board_size=BOARD_SIZE):
+    """取多次运行中最快的一次计算速度，另跑一次测峰值内存"""
+    ops, nodes, seconds, _ = min((run_once(name, position, board_size=board_size) for _ in range(repeats)),
+                                 key=lambda run: run[2] / run[0])
+    peak = run_once(name, position, True, board_size)[3]
+    result = {'ops_per_sec': round(ops / seconds, 1), 'peak_kb': round(peak / 1024, 1)}
+    if nodes:
+        result['nodes_per_sec'] = round(nodes / seconds, 1)
+    return result
+
+def time_to_depth(position, max_depth, repeats=REPEATS, board_size=BOARD_SIZE):
+    """迭代加深到每一层各要多少秒，每次都从新引擎开始，取最快的一次"""
+    results = {}
+    for depth in range(1, max_depth + 1):
+        best = float('inf')
+        for _ in range(repeats):
+            engine = make_engine(position, board_size)
+            start = time.perf_counter()
+            engine.iterative_deepening_search(side_to_move(position), depth, float('inf'))
+            best = min(best, time.perf_counter() - start)
+        results[f'time_to_depth.{position}.{depth}'] = {'seconds': round(best, 5)}
+    return results
+
+def run_suite(names, positions, repeats, max_depth, board_size=BOARD_SIZE):
+    """跑完全部基准，返回{基准名.局面: {指标: 值}}"""
+    results = {}
+    for position in positions:
+        for name in names:
+            results[f'{name}.{position}'] = measure(name, position, repeats, board_size)
+        results.update(time_to_depth(position, max_depth, repeats, board_size))
+    return results
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """与基线逐项比较，返回回退项列表；*_per_sec越大越好，其余越小越好"""
+    regressions = []
+    for key, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            old = baseline.get(key, {}).get(metric)
+            if not old:
+                continue
+            higher_is_better = metric.endswith('_per_sec')
+            change = (value - old) / old
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > threshold else ''
+            print(f'{key:40} {metric:14} {old:>12.6g} -> {value:>12.6g} {change:+7.1%} {flag}')
+            if flag:
+                regressions.append((key, metric, old, value))
+    return regressions
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='Five in a Row engine benchmarks')
+    parser.add_argument('--bench', action='append', choices=sorted(BENCHMARKS),
+                        help='benchmark to run (repeatable, default all)')
+    parser.add_argument('--position', action='append', choices=sorted(POSITIONS),
+                        help='position to run on (repeatable, default all)')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='runs per benchmark, fastest is kept')
+    parser.add_argument('--depth', type=int, default=BENCH_DEPTH, help='deepest time-to-depth measurement')
+    parser.add_argument('--board-size', type=int, default=BOARD_SIZE,
+                        help='board size; the positions are moved to the centre of larger boards')
+    parser.add_argument('--save', metavar='FILE', help='write results as a baseline JSON file')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.bench or list(BENCHMARKS), args.position or list(POSITIONS),
+                        args.repeats, args.depth, args.board_size)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regression(s) against {args.compare}', file=sys.stderr)
+            sys.exit(1)
+    else:
+        for key, metrics in sorted(results.items()):
+            print(f'{key:40} ' + '  '.join(f'{metric}={value}' for metric, value in sorted(metrics.items())))
+
+if __name__ == '__main__':
+    main()
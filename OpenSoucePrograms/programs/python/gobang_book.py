@@ -0,0 +1,60 @@
+"""离线生成开局库：自我对弈后统计前若干手每个规范化局面下各着法的得分，写成有序二进制文件"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from gobang_engine import BOOK_PATH, BOOK_PLIES, SEARCH_DEPTH, THREAT_TIME_LIMIT, Board, canonical_move, write_book
+from gobang_selfplay import play_game
+
+def add_game(record, plies, weights, counts):
+    """把一盘棋前plies手的着法计入统计：赢棋一方的着法得2分，和棋得1分，输棋不得分"""
+    board = Board()
+    winner = record['winner']
+    for ply, (row, col) in enumerate(record['moves'][:plies]):
+        color = 'black' if ply % 2 == 0 else 'white'
+        entry = canonical_move(board, row, col)
+        counts[entry] += 1
+        if winner == color:
+            weights[entry] += 2
+        elif winner is None:
+            weights[entry] += 1
+        board.place(row, col, color)
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='Build the Five in a Row opening book from self-play')
+    parser.add_argument('-n', '--games', type=int, default=1000, help='number of self-play games')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='games played in parallel (one process each)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; game i uses seed + i')
+    parser.add_argument('--time-limit', type=float, default=0.5, help='seconds per AI move')
+    parser.add_argument('--max-depth', type=int, default=SEARCH_DEPTH, help='maximum search depth')
+    parser.add_argument('--plies', type=int, default=BOOK_PLIES, help='opening moves recorded per game')
+    parser.add_argument('--min-count', type=int, default=2,
+                        help='keep a move only if it was played at least this many times')
+    parser.add_argument('-o', '--output', default=BOOK_PATH, help='book file to write')
+    args = parser.parse_args(argv)
+
+    weights = defaultdict(int)
+    counts = defaultdict(int)
+    start_time = time.perf_counter()
+    # 生成时不读旧的开局库，避免新库只是重复旧库的选择
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(play_game, game, args.seed + game, args.time_limit, args.max_depth,
+                                   threat_time_limit=THREAT_TIME_LIMIT, book_path=None)
+                   for game in range(args.games)]
+        for done, future in enumerate(as_completed(futures), 1):
+            add_game(future.result(), args.plies, weights, counts)
+            if done % 100 == 0:
+                print(f'{done}/{args.games} games', file=sys.stderr)
+
+    kept = {entry: weight for entry, weight in weights.items() if counts[entry] >= args.min_count}
+    records = write_book(args.output, kept)
+    print(f'{records} moves from {args.games} games in {time.perf_counter() - start_time:.1f}s '
+          f'written to {args.output}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2251 @@
+"""五子棋引擎：棋盘、棋型评估、算杀和搜索，不依赖pygame，也不持有全局棋局状态"""
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from importlib.util import find_spec
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from collections import OrderedDict, defaultdict
+
+from gobang_geometry import DIRECTION_INDEX, DIRECTIONS, LINE_PAD, get_geometry
+
+try:
+    import fcntl
+except ImportError:  # Windows上用msvcrt给锁文件加锁
+    fcntl = None
+    import msvcrt
+
+# NumPy只在第一次批量评估时才导入，引擎和搜索子进程启动时不付导入的开销；没有NumPy时候选点逐格评估
+NUMPY_AVAILABLE = find_spec('numpy') is not None
+np = None
+
+# 引擎常量
+BOARD_SIZE = 15    # 棋盘大小 15x15
+SEARCH_DEPTH = 8  # 迭代加深的最大深度
+AI_TIME_LIMIT = 1.5  # AI每步思考时间上限（秒）
+SEARCH_RANGE = 4  # 扩大搜索范围
+SEARCH_WORKERS = 1  # 根结点并行搜索的进程数，1表示单进程搜索
+PONDER_MOVES = 3  # 对手思考时预先为其最可能的几种着法算好应手
+
+# 杀手着法表的最大层数
+MAX_PLY = 64
+
+class SearchTimeout(Exception):
+    """搜索超时，用于中止当前这一轮迭代"""
+
+# 优化评分系统
+SCORES = {
+    'five': 100000,        # 连五
+    'live_four': 10000,    # 活四
+    'double_three': 5000,  # 双活三
+    'sleep_four': 1000,    # 冲四
+    'live_three': 500,     # 活三
+    'sleep_three': 200,    # 眠三
+    'live_two': 100,      # 活二
+    'sleep_two': 50       # 眠二
+}
+
+# 必胜分：比任何静态评估都大，减去步数使AI优先选择更快的胜利
+WIN_SCORE = SCORES['five'] * 100
+ASPIRATION_WINDOW = 250  # 迭代加深时渴望窗口的初始半宽，分数落在窗口外时放宽4倍重搜
+
+# 位棋盘常量
+WINDOW_MASK = (1 << 9) - 1   # 9格窗口掩码
+COLOR_INDEX = {'black': 0, 'white': 1}
+COLORS = ('black', 'white')
+
+CENTER_BIT = 1 << LINE_PAD  # 9格窗口的中心位
+
+# Zobrist哈希：每种颜色每个格子一个64位随机键，固定种子保证每次运行哈希一致
+ZOBRIST_SEED = 20240615
+zobrist_tables = {}
+
+def get_zobrist(size):
+    """取某种棋盘大小的Zobrist键，返回(键[颜色][格子], 8种变换下的键[颜色][格子], 走棋方键)
+
+    稠密棋盘按固定种子顺序生成，15x15的键与已有的开局库和证明缓存文件一致；
+    大棋盘的每个键由种子、颜色和格子编号单独算出，只在读到时生成
+    """
+    tables = zobrist_tables.get(size)
+    if tables is not None:
+        return tables
+    geometry = get_geometry(size)
+    generator = random.Random(ZOBRIST_SEED)
+    if geometry.sparse:
+        keys = tuple(geometry.table(lambda index, color_index=color_index:
+                                    random.Random(f'{ZOBRIST_SEED}-{color_index}-{index}').getrandbits(64))
+                     for color_index in range(2))
+    else:
+        keys = tuple(tuple(generator.getrandbits(64) for _ in range(size * size)) for _ in COLOR_INDEX)
+    side = generator.getrandbits(64)  # 轮到白方走时异或进键值
+    # 每种颜色每个格子在8种变换下对应的Zobrist键，落子时一次异或进棋盘的8个对称键值
+    symmetry_keys = tuple(
+        geometry.table(lambda index, own=own: tuple(own[mapping[index]] for mapping in geometry.symmetry_maps))
+        for own in keys
+    )
+    tables = zobrist_tables[size] = keys, symmetry_keys, side
+    return tables
+
+# 规范化：所有按局面索引的缓存（置换表、算杀缓存、开局库）都用8种对称变换下最小的键，
+# 着法也先变换到同一方向再存，取出时用当前局面的变换编号变换回来
+def canonical_key(board):
+    """局面在8种对称变换下Zobrist键的最小值，返回(键, 取到最小值的变换编号)"""
+    return board.canonical()
+
+def to_canonical(board, symmetry, row, col):
+    """把实际方向的着法变换为规范化方向的格子编号"""
+    return board.geometry.symmetry_maps[symmetry][row * board.size + col]
+
+def from_canonical(board, symmetry, index):
+    """把规范化方向的格子编号变换回实际方向的(row, col)"""
+    return divmod(board.geometry.symmetry_inverses[symmetry][index], board.size)
+
+def canonical_move(board, row, col):
+    """把着法变换到规范化方向，返回(规范化键, 格子编号)；局面自身对称时取等价着法中编号最小的"""
+    keys = board.symmetry_hashes
+    key = min(keys)
+    index = row * board.size + col
+    maps = board.geometry.symmetry_maps
+    return key, min(maps[symmetry][index] for symmetry in range(8) if keys[symmetry] == key)
+
+def symmetric_moves(board, row, col):
+    """一个格子在8种对称变换下的全部不同位置"""
+    index = row * board.size + col
+    return sorted({divmod(mapping[index], board.size) for mapping in board.geometry.symmetry_maps})
+
+class SparseCells(dict):
+    """大棋盘的格子表：只存有棋子的格子，空位读出None，写入None时删除"""
+
+    def __missing__(self, index):
+        return None
+
+    def __setitem__(self, index, color):
+        if color is None:
+            self.pop(index, None)
+        else:
+            super().__setitem__(index, color)
+
+class SparseCounts(dict):
+    """大棋盘的计数表：没有记录的格子读出0"""
+
+    def __missing__(self, index):
+        return 0
+
+class PatternCache(dict):
+    """大棋盘的棋型缓存：只存读到过或受落子影响的格子，没有记录的格子读到时由位串算出"""
+
+    def __init__(self, board, color_index):
+        super().__init__()
+        self.board = board
+        self.color_index = color_index
+
+    def __missing__(self, slot):
+        pattern = self[slot] = self.board.compute_pattern(self.color_index, slot)
+        return pattern
+
+class ScoreCache(dict):
+    """大棋盘的棋型分数缓存：格子四个方向的棋型分数之和，第一次读到时算出，之后随棋型增量更新"""
+
+    def __init__(self, patterns):
+        super().__init__()
+        self.patterns = patterns
+
+    def __missing__(self, cell):
+        patterns = self.patterns
+        slot = cell * 4
+        score = self[cell] = (PATTERN_SCORE[patterns[slot]] + PATTERN_SCORE[patterns[slot + 1]] +
+                              PATTERN_SCORE[patterns[slot + 2]] + PATTERN_SCORE[patterns[slot + 3]])
+        return score
+
+class Board:
+    """位棋盘：每种颜色在横、竖、两条斜线上各维护一组整数位串
+
+    超过SPARSE_SIZE的大棋盘只存有子的格子和读到过的棋型，落子、提子和清空的开销与面积无关
+    """
+
+    def __init__(self, size=BOARD_SIZE):
+        self.size = size
+        self.geometry = get_geometry(size)
+        self.sparse = self.geometry.sparse
+        self.zobrist_keys, self.symmetry_zobrist, self.zobrist_side = get_zobrist(size)
+        self.reset()
+
+    def reset(self):
+        """清空棋盘"""
+        geometry = self.geometry
+        area = self.size * self.size
+        line_count = len(geometry.edge_masks)
+        self.lines = ([0] * line_count, [0] * line_count)
+        self.hash = 0
+        self.symmetry_hashes = [0] * 8  # 8种对称变换下的Zobrist键，第0个等于hash
+        self.count = 0
+        self.moves = []  # 落子顺序，用于悔棋
+        # 候选点：与任意棋子距离不超过2的空位；near记录每格周围2格内的棋子数
+        self.frontier = set()
+        # 整盘评估：每条线上双方已成棋型的分数，以及双方的总分
+        self.line_values = ([0] * line_count, [0] * line_count)
+        self.totals = [0, 0]
+        # 棋型缓存：patterns[颜色][格子*4+方向]为在该格落子后该方向的棋型索引，
+        # scores[颜色][格子]为四个方向棋型分数之和；棋型与该格自身是否有子无关
+        if self.sparse:
+            self.cells = SparseCells()
+            self.near = SparseCounts()
+            self.patterns = (PatternCache(self, 0), PatternCache(self, 1))
+            self.scores = (ScoreCache(self.patterns[0]), ScoreCache(self.patterns[1]))
+            return
+        self.cells = [None] * area
+        self.near = [0] * area
+        self.patterns = ([0] * (area * 4), [0] * (area * 4))
+        self.scores = ([0] * area, [0] * area)
+        for line_id, cells in enumerate(geometry.line_cells):
+            self.refresh_patterns(line_id, geometry.line_directions[line_id], cells)
+
+    def get(self, row, col):
+        """获取某个位置的棋子颜色"""
+        return self.cells[row * self.size + col]
+
+    def place(self, row, col, color):
+        """落子，同时更新四个方向的位串、哈希、棋子数和候选点"""
+        index = row * self.size + col
+        self.cells[index] = color
+        color_index = COLOR_INDEX[color]
+        self.hash ^= self.zobrist_keys[color_index][index]
+        self.symmetry_hashes = [key ^ other for key, other in
+                                zip(self.symmetry_hashes, self.symmetry_zobrist[color_index][index])]
+        lines = self.lines[color_index]
+        for line_id, bit in self.geometry.cell_lines[index]:
+            lines[line_id] |= 1 << bit
+        self.count += 1
+        self.moves.append(index)
+        self.frontier.discard(index)
+        near = self.near
+        cells = self.cells
+        for cell in self.geometry.neighbors[2][index]:
+            near[cell] += 1
+            if near[cell] == 1 and cells[cell] is None:
+                self.frontier.add(cell)
+        self.update_patterns(index)
+
+    def remove(self, row, col):
+        """提子，同时更新四个方向的位串、哈希、棋子数和候选点"""
+        index = row * self.size + col
+        color = self.cells[index]
+        if color is None:
+            return
+        self.cells[index] = None
+        color_index = COLOR_INDEX[color]
+        self.hash ^= self.zobrist_keys[color_index][index]
+        self.symmetry_hashes = [key ^ other for key, other in
+                                zip(self.symmetry_hashes, self.symmetry_zobrist[color_index][index])]
+        lines = self.lines[color_index]
+        for line_id, bit in self.geometry.cell_lines[index]:
+            lines[line_id] &= ~(1 << bit)
+        self.count -= 1
+        if self.moves[-1] == index:
+            self.moves.pop()
+        else:
+            self.moves.remove(index)
+        near = self.near
+        for cell in self.geometry.neighbors[2][index]:
+            near[cell] -= 1
+            if near[cell] == 0:
+                self.frontier.discard(cell)
+        if near[index]:
+            self.frontier.add(index)
+        self.update_patterns(index)
+
+    def history(self):
+        """按落子顺序返回[(row, col, color)]，可以在进程间传递"""
+        return [divmod(index, self.size) + (self.cells[index],) for index in self.moves]
+
+    def undo(self):
+        """悔一步棋，返回被撤销的位置"""
+        if not self.moves:
+            return None
+        row, col = divmod(self.moves[-1], self.size)
+        self.remove(row, col)
+        return row, col
+
+    def update_patterns(self, index):
+        """落子或提子后，只重算经过该格的四条线：线上前后4格的棋型缓存和整条线的评估"""
+        black, white = self.lines
+        black_values, white_values = self.line_values
+        totals = self.totals
+        edge_masks = self.geometry.edge_masks
+        neighbors = self.geometry.line_neighbors[index]
+        for direction, (line_id, _) in enumerate(self.geometry.cell_lines[index]):
+            self.refresh_patterns(line_id, direction, neighbors[direction])
+            edge = edge_masks[line_id]
+            value = evaluate_line(black[line_id], white[line_id] | edge)
+            totals[0] += value - black_values[line_id]
+            black_values[line_id] = value
+            value = evaluate_line(white[line_id], black[line_id] | edge)
+            totals[1] += value - white_values[line_id]
+            white_values[line_id] = value
+
+    def refresh_patterns(self, line_id, direction, cells):
+        """重算一条线上指定格子在该方向上双方的棋型和分数"""
+        black_patterns, white_patterns = self.patterns
+        black_scores, white_scores = self.scores
+        black_line = self.lines[0][line_id]
+        white_line = self.lines[1][line_id]
+        edge = self.geometry.edge_masks[line_id]
+        if self.sparse:
+            # 大棋盘的分数只在已经算过时增量更新：有分数的格子四个方向的棋型一定都在缓存里
+            for cell, bit in cells:
+                shift = bit - LINE_PAD
+                black = (black_line >> shift) & WINDOW_MASK
+                white = (white_line >> shift) & WINDOW_MASK
+                blocked = (edge >> shift) & WINDOW_MASK
+                slot = cell * 4 + direction
+                pattern = BASE3[black | CENTER_BIT] + 2 * BASE3[(white | blocked) & ~CENTER_BIT]
+                if cell in black_scores:
+                    black_scores[cell] += PATTERN_SCORE[pattern] - PATTERN_SCORE[black_patterns[slot]]
+                black_patterns[slot] = pattern
+                pattern = BASE3[white | CENTER_BIT] + 2 * BASE3[(black | blocked) & ~CENTER_BIT]
+                if cell in white_scores:
+                    white_scores[cell] += PATTERN_SCORE[pattern] - PATTERN_SCORE[white_patterns[slot]]
+                white_patterns[slot] = pattern
+            return
+        for cell, bit in cells:
+            shift = bit - LINE_PAD
+            black = (black_line >> shift) & WINDOW_MASK
+            white = (white_line >> shift) & WINDOW_MASK
+            blocked = (edge >> shift) & WINDOW_MASK
+            slot = cell * 4 + direction
+            pattern = BASE3[black | CENTER_BIT] + 2 * BASE3[(white | blocked) & ~CENTER_BIT]
+            black_scores[cell] += PATTERN_SCORE[pattern] - PATTERN_SCORE[black_patterns[slot]]
+            black_patterns[slot] = pattern
+            pattern = BASE3[white | CENTER_BIT] + 2 * BASE3[(black | blocked) & ~CENTER_BIT]
+            white_scores[cell] += PATTERN_SCORE[pattern] - PATTERN_SCORE[white_patterns[slot]]
+            white_patterns[slot] = pattern
+
+    def compute_pattern(self, color_index, slot):
+        """由位串直接算出格子*4+方向处的棋型索引，与refresh_patterns写入缓存的值相同"""
+        cell, direction = divmod(slot, 4)
+        line_id, bit = self.geometry.cell_lines[cell][direction]
+        shift = bit - LINE_PAD
+        own = (self.lines[color_index][line_id] >> shift) & WINDOW_MASK
+        other = ((self.lines[1 - color_index][line_id] | self.geometry.edge_masks[line_id]) >> shift) & WINDOW_MASK
+        return BASE3[own | CENTER_BIT] + 2 * BASE3[other & ~CENTER_BIT]
+
+    def canonical(self):
+        """规范化：返回(8种对称变换下最小的Zobrist键, 取到它的变换编号)"""
+        key = min(self.symmetry_hashes)
+        return key, self.symmetry_hashes.index(key)
+
+    def stone_count(self):
+        """棋盘上的棋子数"""
+        return self.count
+
+    def candidate_moves(self):
+        """与已有棋子距离不超过2的全部空位"""
+        return [divmod(index, self.size) for index in self.frontier]
+
+    def window(self, row, col, direction, color):
+        """取以(row, col)为中心的9格窗口，返回(己方掩码, 对方或出界掩码)"""
+        line_id, bit = self.geometry.cell_lines[row * self.size + col][direction]
+        shift = bit - LINE_PAD
+        color_index = COLOR_INDEX[color]
+        own = (self.lines[color_index][line_id] >> shift) & WINDOW_MASK
+        other = ((self.lines[1 - color_index][line_id] | self.geometry.edge_masks[line_id]) >> shift) & WINDOW_MASK
+        return own, other
+
+    def pattern_index(self, row, col, direction, color):
+        """取在(row, col)落下color后某个方向的棋型索引，直接读缓存"""
+        return self.patterns[COLOR_INDEX[color]][(row * self.size + col) * 4 + direction]
+
+    def cell_patterns(self, row, col, color):
+        """取在(row, col)落下color后四个方向的棋型索引"""
+        patterns = self.patterns[COLOR_INDEX[color]]
+        slot = (row * self.size + col) * 4
+        return [patterns[slot], patterns[slot + 1], patterns[slot + 2], patterns[slot + 3]]
+
+    def cell_score(self, row, col, color):
+        """取在(row, col)落下color后四个方向的棋型分数之和"""
+        return self.scores[COLOR_INDEX[color]][row * self.size + col]
+
+    def run_length(self, row, col, direction, color):
+        """计算经过(row, col)的同色连子数，当前格视为己方棋子"""
+        line_id, bit = self.geometry.cell_lines[row * self.size + col][direction]
+        line = self.lines[COLOR_INDEX[color]][line_id] | (1 << bit)
+        # 正向：统计从当前位开始的连续1
+        upper = line >> bit
+        forward = (upper ^ (upper + 1)).bit_length() - 1
+        # 反向：找到当前位以下最高的空位
+        gaps = ~line & ((1 << (bit + 1)) - 1)
+        backward = bit + 1 - gaps.bit_length()
+        return forward + backward - 1
+
+    def makes_five(self, row, col, color):
+        """检查在(row, col)落下color后是否形成五连"""
+        for direction in range(4):
+            if self.run_length(row, col, direction, color) >= 5:
+                return True
+        return False
+
+    def has_neighbor(self, row, col):
+        """检查周围8格内是否有棋子"""
+        cells = self.cells
+        for cell in self.geometry.neighbors[1][row * self.size + col]:
+            if cells[cell] is not None:
+                return True
+        return False
+
+    def free_neighbors(self, row, col):
+        """统计周围8格内的空位数（出界不算）"""
+        cells = self.cells
+        free = 0
+        for cell in self.geometry.neighbors[1][row * self.size + col]:
+            if cells[cell] is None:
+                free += 1
+        return free
+
+
+# 置换表条目类型：精确值、下界、上界
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+TT_SIZE = 1 << 16  # 置换表槽数，必须是2的幂
+
+class TranspositionTable:
+    """定长置换表：按键值低位取槽，新搜索或更深的结果可以覆盖旧条目"""
+
+    def __init__(self, size=TT_SIZE):
+        self.mask = size - 1
+        self.slots = [None] * size
+        self.generation = 0
+
+    def clear(self):
+        """清空置换表"""
+        self.slots = [None] * (self.mask + 1)
+        self.generation = 0
+
+    def new_search(self):
+        """开始新一轮搜索，上一轮的条目变为可替换"""
+        self.generation += 1
+
+    def probe(self, key):
+        """查询置换表，返回(键, 深度, 类型, 分数, 最佳着法, 代数)或None，最佳着法是规范化方向的格子编号"""
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        """写入置换表，同一槽位优先保留本轮搜索中更深的结果"""
+        index = key & self.mask
+        old = self.slots[index]
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            self.slots[index] = (key, depth, flag, score, move, self.generation)
+
+# 增加开局库（相对天元的偏移，规范化方向，每个着法代表它的全部对称位置）
+OPENING_MOVES = [
+    [(0, 0)],    # 天元
+    [(-4, -4)],  # 小角，15x15上为(3, 3)，对称位置为(3, 11)、(11, 3)、(11, 11)
+]
+
+# 开局库文件：文件头之后是按(键, 权重降序)排好的定长记录，键和着法都是规范化方向下的
+BOOK_MAGIC = b'GBK1'
+BOOK_HEADER = struct.Struct('<4sHHI')  # 标识、棋盘大小、保留、记录数
+BOOK_RECORD = struct.Struct('<QHI')    # 规范化局面键、规范化着法格子编号、权重
+BOOK_PLIES = 12                        # 开局库只用于前12手
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gobang_book.bin')
+
+class OpeningBook:
+    """开局库：内存映射的有序记录文件，按规范化局面键二分查找"""
+
+    def __init__(self, path, board_size=BOARD_SIZE):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size, _, self.count = BOOK_HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or size != board_size:
+            self.data.close()
+            raise ValueError(f'{path} is not a {board_size}x{board_size} opening book')
+
+    @classmethod
+    def load(cls, path=BOOK_PATH, board_size=BOARD_SIZE):
+        """打开开局库，文件不存在时返回None"""
+        if path is None or not os.path.exists(path):
+            return None
+        return cls(path, board_size)
+
+    def close(self):
+        """解除内存映射"""
+        self.data.close()
+
+    def record(self, position):
+        """读取第position条记录"""
+        return BOOK_RECORD.unpack_from(self.data, BOOK_HEADER.size + position * BOOK_RECORD.size)
+
+    def lookup(self, key):
+        """二分查找规范化键，返回[(规范化着法, 权重)]，按权重从大到小"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.count:
+            record_key, move, weight = self.record(low)
+            if record_key != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    def choose(self, board, rng=random):
+        """按权重随机选一个开局库着法并变换回棋盘的实际方向，没有可用着法时返回None"""
+        key, symmetry = canonical_key(board)
+        entries = self.lookup(key)
+        if not entries:
+            return None
+        pick = rng.uniform(0, sum(weight for _, weight in entries))
+        for move, weight in entries:
+            pick -= weight
+            if pick <= 0:
+                break
+        row, col = from_canonical(board, symmetry, move)
+        if board.get(row, col) is not None:
+            return None
+        return row, col
+
+def write_book(path, weights, board_size=BOARD_SIZE):
+    """把{(规范化键, 规范化着法): 权重}写成开局库文件，权重为0的着法不写入"""
+    records = sorted(((key, move, weight) for (key, move), weight in weights.items() if weight > 0),
+                     key=lambda record: (record[0], -record[2], record[1]))
+    with open(path, 'wb') as file:
+        file.write(BOOK_HEADER.pack(BOOK_MAGIC, board_size, 0, len(records)))
+        for record in records:
+            file.write(BOOK_RECORD.pack(*record))
+    return len(records)
+
+def classify_pattern_string(pattern):
+    """按字符串规则评估棋型，只在建表时使用"""
+    # 必胜棋型
+    if '11111' in pattern:
+        return 'five'
+    if '011110' in pattern:
+        return 'live_four'
+    
+    # 双活三检查
+    if pattern.count('01110') >= 2:
+        return 'double_three'
+        
+    # 单个棋型
+    if '011110' in pattern:
+        return 'live_four'
+    if '01111' in pattern or '11110' in pattern:
+        return 'sleep_four'
+    if '01110' in pattern:
+        return 'live_three'
+    if '11100' in pattern or '00111' in pattern:
+        return 'sleep_three'
+    if '01100' in pattern or '00110' in pattern:
+        return 'live_two'
+    if '11000' in pattern or '00011' in pattern:
+        return 'sleep_two'
+    
+    return None
+
+# 9格窗口的棋型特征位，窗口中'1'为己方，'0'为空，'2'为对方或出界
+PAT_FIVE = 1 << 0          # 连五
+PAT_LIVE_FOUR = 1 << 1     # 活四
+PAT_FOUR = 1 << 2          # 冲四（包含活四）
+PAT_LIVE_THREE = 1 << 3    # 活三
+PAT_THREE = 1 << 4         # 连续三子
+PAT_SLEEP_THREE = 1 << 5   # 眠三
+PAT_LIVE_TWO = 1 << 6      # 活二
+PAT_SPLIT_THREE = 1 << 7   # 跳活三（潜在活四）
+PAT_OPEN_THREE = 1 << 8    # 潜在活三
+PAT_ANY_FOUR = 1 << 9      # 四：再下一子即可成五（冲四、活四、跳冲四）
+
+PATTERN_FEATURES = [
+    (PAT_FIVE, ('11111',)),
+    (PAT_LIVE_FOUR, ('011110',)),
+    (PAT_FOUR, ('01111', '11110')),
+    (PAT_LIVE_THREE, ('01110',)),
+    (PAT_THREE, ('111',)),
+    (PAT_SLEEP_THREE, ('11100', '00111')),
+    (PAT_LIVE_TWO, ('01100', '00110')),
+    (PAT_SPLIT_THREE, ('010110', '011010')),
+    (PAT_OPEN_THREE, ('001110', '011100')),
+    (PAT_ANY_FOUR, ('01111', '10111', '11011', '11101', '11110')),
+]
+
+def build_pattern_tables():
+    """枚举中心为己方棋子的3^8种9格窗口，预先算出棋型类别和特征位"""
+    classes = [None] * 3 ** 9
+    flags = [0] * 3 ** 9
+    # 中心两侧各4格的全部排列：(字符串, 3进制值)，第i格对应第i位三进制数
+    halves = [('', 0)]
+    for i in range(4):
+        halves = [(text + '012'[cell], value + cell * 3 ** i)
+                  for text, value in halves for cell in range(3)]
+    # 查询时中心格总是己方棋子，其余窗口不会被用到
+    for left, left_value in halves:
+        left = left + '1'
+        left_value += 3 ** 4
+        for right, right_value in halves:
+            pattern = left + right
+            index = left_value + right_value * 3 ** 5
+            classes[index] = classify_pattern_string(pattern)
+            pattern_flags = 0
+            for flag, substrings in PATTERN_FEATURES:
+                for substring in substrings:
+                    if substring in pattern:
+                        pattern_flags |= flag
+                        break
+            flags[index] = pattern_flags
+    return tuple(classes), tuple(flags)
+
+# 棋型表：索引为窗口的3进制编码，启动时建表一次
+PATTERN_CLASS, PATTERN_FLAGS = build_pattern_tables()
+# 9位掩码到3进制值的换算表，窗口索引 = BASE3[己方掩码] + 2 * BASE3[对方掩码]
+BASE3 = tuple(sum(3 ** i for i in range(9) if mask >> i & 1) for mask in range(1 << 9))
+# 每种棋型对应的分数，没有棋型为0
+PATTERN_SCORE = tuple(SCORES[pattern_class] if pattern_class else 0 for pattern_class in PATTERN_CLASS)
+
+# 整条线评估的缓存，键为(己方位串, 对方位串|边界)
+LINE_CACHE_SIZE = 1 << 18
+LINE_CACHE_LIMIT = LINE_CACHE_SIZE  # 当前上限，Engine.set_memory_limit可以调小
+line_value_cache = {}
+
+def evaluate_line(own, other):
+    """一条线上己方已成棋型的分数：每段连续棋子取以段首为中心的9格窗口查表"""
+    key = (own, other)
+    value = line_value_cache.get(key)
+    if value is None:
+        value = 0
+        starts = own & ~(own << 1)  # 每段连续棋子的第一个位
+        while starts:
+            low = starts & -starts
+            shift = low.bit_length() - 1 - LINE_PAD
+            value += PATTERN_SCORE[BASE3[(own >> shift) & WINDOW_MASK] +
+                                   2 * BASE3[(other >> shift) & WINDOW_MASK]]
+            starts ^= low
+        if len(line_value_cache) >= LINE_CACHE_LIMIT:
+            line_value_cache.clear()
+        line_value_cache[key] = value
+    return value
+
+def evaluate_board(board, color):
+    """整盘静态评估：color一方已成棋型的总分减去对方的总分，结果确定且可增量更新"""
+    color_index = COLOR_INDEX[color]
+    return board.totals[color_index] - board.totals[1 - color_index]
+
+def evaluate_pattern(pattern):
+    """查表评估棋型"""
+    return PATTERN_CLASS[pattern]
+
+def get_line_pattern(board, row, col, dx, dy, color):
+    """获取在(row, col)落下color后某个方向的棋型索引"""
+    return board.pattern_index(row, col, DIRECTION_INDEX[(dx, dy)], color)
+
+def check_double_three(board, row, col, color):
+    """检查是否形成双活三"""
+    count_live_three = 0
+    
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if flags & PAT_LIVE_THREE:
+            count_live_three += 1
+            if count_live_three >= 2:
+                return True
+    
+    return False
+
+def check_double_two(board, row, col, color):
+    """检查是否形成双活二"""
+    count_live_two = 0
+    
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if flags & PAT_LIVE_TWO:
+            count_live_two += 1
+            if count_live_two >= 2:
+                return True
+    
+    return False
+
+def get_board_hash(board):
+    """获取当前棋盘状态的哈希值"""
+    # 落子和提子时增量更新的64位Zobrist键
+    return board.hash
+
+def evaluate_continuous_threat(board, row, col, color):
+    """评估连续威胁"""
+    score = 0
+    
+    # 检查是否能在下一步形成威胁
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if flags & PAT_LIVE_FOUR:  # 活四
+            score += SCORES['live_four'] * 0.5
+        elif flags & PAT_LIVE_THREE:  # 活三
+            score += SCORES['live_three'] * 0.3
+    
+    return score
+
+def check_straight_line(board, row, col, color):
+    """检查是否有直线连子威胁"""
+    directions = [(1, 0), (0, 1)]  # 只检查横向和竖向
+    
+    for direction in directions:
+        if board.run_length(row, col, DIRECTION_INDEX[direction], color) >= 3:  # 发现三连或更多
+            return True
+            
+    return False
+
+def check_diagonal_line(board, row, col, color):
+    """检查斜线连子威胁"""
+    directions = [(1, 1), (1, -1)]  # 只检查两个斜向
+    
+    for direction in directions:
+        if board.run_length(row, col, DIRECTION_INDEX[direction], color) >= 3:  # 发现三连或更多
+            return True
+            
+    return False
+
+def evaluate_position(board, row, col, color, rng=random):
+    """优化位置评估，增加策略性"""
+    if not (0 <= row < board.size and 0 <= col < board.size) or board.get(row, col) is not None:
+        return 0
+        
+    score = 0
+    opponent = 'black' if color == 'white' else 'white'
+    
+    # 进攻评估（直接读取棋型缓存）
+    attack_score = 0
+    for pattern in board.cell_patterns(row, col, color):
+        pattern_score = evaluate_pattern(pattern)
+        if pattern_score:
+            attack_score += SCORES[pattern_score]
+            # 奖励连续进攻
+            if PATTERN_FLAGS[pattern] & PAT_THREE:
+                attack_score *= 1.5
+                
+    # 防守评估
+    defense_score = board.cell_score(row, col, opponent)
+    
+    # 动态位置价值评估
+    position_value = 150 * board.geometry.center_weight[row * board.size + col]
+    
+    # 根据局势动态调整权重
+    piece_count = board.stone_count()
+    if piece_count < board.size * 2:  # 开局更注重位置和灵活性
+        position_weight = rng.uniform(1.3, 1.7)
+        attack_weight = rng.uniform(0.8, 1.2)
+        defense_weight = rng.uniform(0.8, 1.2)
+    else:  # 中后期更注重进攻和防守
+        position_weight = rng.uniform(0.6, 0.9)
+        attack_weight = rng.uniform(1.2, 1.5)
+        defense_weight = rng.uniform(1.1, 1.4)
+    
+    # 计算最终分数
+    final_score = (attack_score * attack_weight + 
+                  defense_score * defense_weight + 
+                  position_value * position_weight)
+    
+    # 增加策略考量
+    if check_continuous_threat(board, row, col, color):
+        final_score *= rng.uniform(1.2, 1.4)
+    if check_offensive_pattern(board, row, col, color):
+        final_score *= rng.uniform(1.1, 1.3)
+    if check_flexibility(board, row, col, color):
+        final_score *= rng.uniform(1.1, 1.2)
+        
+    return final_score
+
+def evaluate_position_value(board, row, col, color):
+    """评估位置的基础价值"""
+    score = 0
+    index = row * board.size + col
+    
+    # 中心区域权重
+    center_weight = 1.5 - board.geometry.center_manhattan[index] / (board.size * 2)
+    score += 100 * center_weight
+    
+    # 检查是否在边缘
+    if board.geometry.on_edge[index]:
+        score -= 50  # 降低边缘位置的分数
+    
+    # 检查是否能形成包围态势
+    surround_score = 0
+    opponent = 'black' if color == 'white' else 'white'
+    for direction in range(4):
+        own, _ = board.window(row, col, direction, color)
+        enemy, blocked = board.window(row, col, direction, opponent)
+        own_count = own.bit_count()
+        opponent_count = enemy.bit_count()
+        # blocked中包含己方棋子和出界格
+        space_count = 9 - opponent_count - blocked.bit_count()
+        
+        # 评估包围价值
+        if own_count >= 2 and space_count >= 2:
+            surround_score += 200
+        if opponent_count >= 2 and space_count >= 2:
+            surround_score += 150  # 也要考虑阻止对手的包围
+    
+    score += surround_score
+    return score
+
+def evaluate_strategic_value(board, row, col, color):
+    """增强战略评估"""
+    score = 0
+    opponent = 'black' if color == 'white' else 'white'
+    index = row * board.size + col
+    geometry = board.geometry
+    
+    # 中心控制评估
+    center_score = (board.size - geometry.center_distance[index]) * 100
+    score += center_score
+    
+    # 局部优势评估：周围2格内的棋子，越近权重越大
+    local_score = 0
+    cells = board.cells
+    for cell, distance in zip(geometry.neighbors[2][index], geometry.neighbor_distances[2][index]):
+        stone = cells[cell]
+        if stone == color:
+            local_score += 200 / (distance + 1)
+        elif stone == opponent:
+            local_score -= 150 / (distance + 1)
+    score += local_score
+    
+    # 防守性评估：相邻的对方棋子即窗口中心两侧的位
+    defense_score = 0
+    for direction in range(4):
+        enemy, _ = board.window(row, col, direction, opponent)
+        defense_score += 300 * (enemy & 0b000101000).bit_count()
+    score += defense_score
+    
+    return score
+
+def evaluate_offensive_value(board, row, col, color):
+    """评估进攻价值"""
+    score = 0
+    
+    # 检查是否能形成活二
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if flags & PAT_LIVE_TWO:
+            score += SCORES['live_two']
+    
+    # 检查一子多通
+    live_two_count = 0
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if flags & PAT_LIVE_TWO:
+            live_two_count += 1
+    if live_two_count >= 2:
+        score *= 2  # 一子多通加倍分数
+    
+    return score
+
+def evaluate_defensive_value(board, row, col, opponent_color):
+    """增强防守评估"""
+    score = 0
+    
+    # 检查四个方向的威胁
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, opponent_color)]
+        
+        # 必须防守的情况
+        if flags & PAT_FIVE:  # 连五
+            score += SCORES['five'] * 2
+        elif flags & PAT_LIVE_FOUR:  # 活四
+            score += SCORES['live_four'] * 2
+        elif flags & PAT_FOUR:  # 冲四
+            score += SCORES['sleep_four'] * 1.5
+        elif flags & PAT_LIVE_THREE:  # 活三
+            score += SCORES['live_three'] * 1.5
+        elif flags & PAT_THREE:  # 连续三子
+            score += SCORES['live_three']
+        
+        # 检查潜在威胁
+        if flags & PAT_SLEEP_THREE:  # 眠三
+            score += SCORES['sleep_three'] * 1.2
+        if flags & PAT_LIVE_TWO:  # 活二
+            score += SCORES['live_two'] * 1.2
+    
+    # 检查多重威胁
+    threat_count = 0
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, opponent_color)]
+        if (flags & PAT_FOUR or  # 冲四
+            flags & PAT_LIVE_THREE):  # 活三
+            threat_count += 1
+    
+    if threat_count >= 2:  # 多重威胁
+        score *= 3
+    
+    return score
+
+def get_valid_moves(board):
+    """获取有效的落子位置"""
+    # 候选点集合随落子增量维护，不需要扫描棋盘
+    if board.count == 0:
+        center = board.size // 2
+        return [(center, center)]
+    
+    return board.candidate_moves()
+
+def has_neighbor(board, row, col):
+    """检查是否有相邻的棋子"""
+    return board.has_neighbor(row, col)
+
+def check_draw(board):
+    """检查是否平局"""
+    # 检查是否还有空位
+    return board.count == board.size * board.size
+
+def check_critical_threat(board, row, col, color):
+    """检查是否有关键威胁（活四或双活三）"""
+    has_threat = False
+    
+    # 检查活四
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if flags & PAT_LIVE_FOUR:  # 活四
+            has_threat = True
+            break
+    
+    # 检查双活三
+    if not has_threat:
+        three_count = 0
+        for dx, dy in DIRECTIONS:
+            flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+            if flags & PAT_LIVE_THREE:  # 活三
+                three_count += 1
+                if three_count >= 2:
+                    has_threat = True
+                    break
+    
+    return has_threat
+
+def evaluate_complex_pattern(board, row, col, color):
+    """评估复杂棋型组合"""
+    score = 0
+    
+    # 检查四个方向
+    patterns = []
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        patterns.append(flags)
+    
+    # 检查复杂棋型组合
+    four_count = 0  # 四的数量
+    three_count = 0  # 活三数量
+    sleep_three_count = 0  # 眠三数量
+    two_count = 0  # 活二数量
+    
+    for flags in patterns:
+        # 检查活四
+        if flags & PAT_LIVE_FOUR:
+            score += SCORES['live_four']
+            four_count += 1
+        # 检查冲四
+        elif flags & PAT_FOUR:
+            score += SCORES['sleep_four']
+            four_count += 1
+        # 检查活三
+        elif flags & PAT_LIVE_THREE:
+            score += SCORES['live_three']
+            three_count += 1
+        # 检查眠三
+        elif flags & PAT_SLEEP_THREE:
+            score += SCORES['sleep_three']
+            sleep_three_count += 1
+        # 检查活二
+        elif flags & PAT_LIVE_TWO:
+            score += SCORES['live_two']
+            two_count += 1
+    
+    # 评估组合棋型
+    if four_count >= 2:
+        score += SCORES['double_four']
+    if three_count >= 2:
+        score += SCORES['double_three']
+    if two_count >= 2:
+        score += SCORES['double_two']
+    
+    # 检查潜在威胁
+    for flags in patterns:
+        if flags & PAT_SPLIT_THREE:  # 潜在活四
+            score += SCORES['live_three']
+        if flags & PAT_OPEN_THREE:  # 潜在活三
+            score += SCORES['potential_three']
+    
+    return score
+
+def check_win(board, row, col):
+    """检查是否获胜"""
+    # 横、竖、右斜、左斜四个方向的连子数都由位串直接算出
+    return board.makes_five(row, col, board.get(row, col))
+
+def evaluate_opening_stage(board):
+    """评估是否处于开局阶段"""
+    piece_count = board.stone_count()
+    return piece_count <= 7  # 7手以内为开局阶段
+
+def get_opening_move(board):
+    """获取开局阶段的落子位置"""
+    piece_count = board.stone_count()
+    
+    # 白棋开局以防守为主
+    if piece_count < 4:
+        # 优先选择靠近黑子的位置进行防守（按棋盘顺序遍历已落下的黑子）
+        for index in sorted(board.moves):
+            if board.cells[index] == 'black':
+                # 在黑子周围2格范围内寻找防守点
+                for cell in board.geometry.neighbors[2][index]:
+                    if board.cells[cell] is None:
+                        return divmod(cell, board.size)
+    
+    return None
+
+# 算杀参数
+VCF_DEPTH = 12             # 连续冲四时攻方最多走的步数
+VCT_DEPTH = 6              # 冲四活三组合时攻方最多走的步数
+THREAT_MAX_NODES = 20000   # 单次算杀的结点上限
+THREAT_TIME_LIMIT = 0.2    # 单次算杀的时间上限（秒）
+THREAT_SHARE = 0.15        # VCF和VCT各自最多占每步时间的比例，其余留给迭代加深
+THREAT_CACHE_SIZE = 1 << 16  # 证明缓存最多保留的局面数，超出时淘汰最久未用的
+
+# 证明缓存文件：记录按最近使用的先后顺序排列，读入后保持同样的淘汰顺序
+PROOF_MAGIC = b'GBP1'
+PROOF_HEADER = struct.Struct('<4sHHI')  # 标识、棋盘大小、保留、记录数
+PROOF_RECORD = struct.Struct('<QBBBH')  # 规范化局面键、攻方和是否算活三、必胜深度、不胜深度、规范化着法
+PROOF_NO_WIN = 0xFF                     # 必胜深度的占位值：还没有证明必胜
+PROOF_NO_MOVE = 0xFFFF                  # 着法占位值，格子编号只有16位，证明缓存文件最大支持255x255
+
+class ThreatSearchAbort(Exception):
+    """算杀超出结点数或时间限制"""
+
+def merge_proof(old, new):
+    """合并同一局面的两条证明：必胜取较浅的深度和着法，不胜取较深的深度"""
+    win_depth, move, no_win_depth = old
+    if new[0] is not None and (win_depth is None or new[0] < win_depth):
+        win_depth, move = new[0], new[1]
+    return win_depth, move, max(no_win_depth, new[2])
+
+def check_proof_size(board_size):
+    """证明缓存文件的着法只有16位，更大的棋盘抛出ValueError"""
+    if board_size * board_size > PROOF_NO_MOVE:
+        raise ValueError(f'proof caches support boards up to 255x255, not {board_size}x{board_size}')
+
+@contextmanager
+def proof_lock(path):
+    """在证明缓存文件旁的锁文件上持有排他锁，多个进程同时读-合并-写同一个文件时不会互相覆盖"""
+    with open(f'{path}.lock', 'a+b') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        yield  # 关闭锁文件时释放锁
+
+def read_proofs(path, board_size=BOARD_SIZE):
+    """读取证明缓存文件，返回[(键, (必胜深度, 着法, 不胜深度))]，文件不存在时返回空列表"""
+    if path is None:
+        return []
+    # 文件还不存在时也先检查，不要等到对局结束写回时才发现棋盘太大
+    check_proof_size(board_size)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, size, _, count = PROOF_HEADER.unpack_from(data, 0)
+    if magic != PROOF_MAGIC or size != board_size:
+        raise ValueError(f'{path} is not a {board_size}x{board_size} proof cache')
+    proofs = []
+    for key, flags, win_depth, no_win_depth, move in PROOF_RECORD.iter_unpack(
+            data[PROOF_HEADER.size:PROOF_HEADER.size + count * PROOF_RECORD.size]):
+        proofs.append(((key, flags & 1, bool(flags & 2)),
+                       (None if win_depth == PROOF_NO_WIN else win_depth,
+                        None if move == PROOF_NO_MOVE else move, no_win_depth)))
+    return proofs
+
+def write_proofs(path, proofs, board_size=BOARD_SIZE):
+    """把[(键, 证明)]写成证明缓存文件；先写临时文件再替换，并发写入时不会留下半个文件"""
+    check_proof_size(board_size)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(PROOF_HEADER.pack(PROOF_MAGIC, board_size, 0, len(proofs)))
+        for (key, attacker, use_threes), (win_depth, move, no_win_depth) in proofs:
+            file.write(PROOF_RECORD.pack(key, attacker | use_threes << 1,
+                                         PROOF_NO_WIN if win_depth is None else win_depth,
+                                         no_win_depth, PROOF_NO_MOVE if move is None else move))
+    os.replace(temporary, path)
+    return len(proofs)
+
+class ThreatSolver:
+    """VCF/VCT算杀：只展开冲四、活三及其防守点，带独立缓存和结点/时间限制"""
+
+    def __init__(self, board, cache_size=THREAT_CACHE_SIZE, stop_event=None):
+        self.board = board
+        self.stop_event = stop_event or threading.Event()  # 外部置位后尽快中止算杀
+        self.cache_size = cache_size
+        # 证明缓存：(规范化键, 攻方, 是否算活三) -> (必胜深度, 规范化着法, 不胜深度)，按最近使用排序
+        # 只保存完整搜完的结论，中止的搜索不写入，所以缓存跨局面、跨对局都成立
+        self.cache = OrderedDict()
+        self.nodes = 0
+        self.max_nodes = THREAT_MAX_NODES
+        self.deadline = None
+
+    def clear(self):
+        """清空算杀缓存"""
+        self.cache.clear()
+
+    def store(self, key, depth, move):
+        """记录一个完整搜完的结论：move为None表示depth步内不胜，否则是depth步内必胜的规范化着法"""
+        proof = (None, None, depth) if move is None else (depth, move, 0)
+        old = self.cache.pop(key, None)
+        self.cache[key] = proof if old is None else merge_proof(old, proof)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def load(self, path):
+        """从文件读入证明缓存，与内存中已有的结论合并"""
+        for key, proof in read_proofs(path, self.board.size)[-self.cache_size:]:
+            old = self.cache.pop(key, None)
+            self.cache[key] = proof if old is None else merge_proof(old, proof)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def save(self, path):
+        """把证明缓存写入文件，先合并文件里其他引擎写入的结论，最近使用的排在最后；读到写之间持有文件锁"""
+        with proof_lock(path):
+            proofs = OrderedDict(read_proofs(path, self.board.size))
+            for key, proof in self.cache.items():
+                old = proofs.pop(key, None)
+                proofs[key] = proof if old is None else merge_proof(old, proof)
+            return write_proofs(path, list(proofs.items())[-self.cache_size:], self.board.size)
+
+    def solve(self, color, mode='vcf', max_depth=None, time_limit=THREAT_TIME_LIMIT,
+              max_nodes=THREAT_MAX_NODES):
+        """寻找color一方的VCF或VCT必胜，返回第一步着法，找不到返回None"""
+        if max_depth is None:
+            max_depth = VCF_DEPTH if mode == 'vcf' else VCT_DEPTH
+        return self.run(self.attack, COLOR_INDEX[color], mode == 'vct', max_depth,
+                        time_limit, max_nodes)
+
+    def check_move(self, row, col, color, mode='vcf', max_depth=None,
+                   time_limit=THREAT_TIME_LIMIT, max_nodes=THREAT_MAX_NODES):
+        """检查从(row, col)这一手开始，color一方能否以VCF或VCT取胜"""
+        if max_depth is None:
+            max_depth = VCF_DEPTH if mode == 'vcf' else VCT_DEPTH
+        attacker = COLOR_INDEX[color]
+        threat = self.classify_threat(row * self.board.size + col, attacker, mode == 'vct')
+        if threat is None:
+            return False
+
+        def search(attacker, use_threes, depth):
+            self.board.place(row, col, color)
+            won = self.defend(attacker, use_threes, depth, *threat)
+            self.board.remove(row, col)
+            return won
+        return bool(self.run(search, attacker, mode == 'vct', max_depth, time_limit, max_nodes))
+
+    def run(self, search, attacker, use_threes, max_depth, time_limit, max_nodes):
+        """在结点和时间限制下执行搜索，超限时撤销试探落子并返回None"""
+        self.nodes = 0
+        self.max_nodes = max_nodes
+        self.deadline = time.perf_counter() + time_limit
+        moves_before = len(self.board.moves)
+        try:
+            return search(attacker, use_threes, max_depth)
+        except ThreatSearchAbort:
+            while len(self.board.moves) > moves_before:
+                self.board.undo()
+            return None
+
+    def count_node(self):
+        """结点计数，超出限制时中止"""
+        self.nodes += 1
+        if self.nodes > self.max_nodes or (self.nodes & 63 == 0 and (
+                time.perf_counter() > self.deadline or self.stop_event.is_set())):
+            raise ThreatSearchAbort
+
+    def classify_threat(self, cell, attacker, use_threes):
+        """判断在cell落子构成的威胁，返回(格子, 是否为四, 方向)，不构成威胁返回None"""
+        patterns = self.board.patterns[attacker]
+        slot = cell * 4
+        three_direction = None
+        for direction in range(4):
+            flags = PATTERN_FLAGS[patterns[slot + direction]]
+            if flags & PAT_ANY_FOUR:
+                return cell, True, direction
+            if three_direction is None and flags & (PAT_LIVE_THREE | PAT_SPLIT_THREE):
+                three_direction = direction
+        if use_threes and three_direction is not None:
+            return cell, False, three_direction
+        return None
+
+    def attack(self, attacker, use_threes, depth):
+        """攻方结点：返回保证取胜的着法，没有则返回None"""
+        self.count_node()
+        five = SCORES['five']
+        attacker_scores = self.board.scores[attacker]
+        wins = [cell for cell in self.board.frontier if attacker_scores[cell] >= five]
+        if wins:
+            return divmod(wins[0], self.board.size)
+        if depth == 0:
+            return None
+        canonical, symmetry = self.board.canonical()
+        key = (canonical, attacker, use_threes)
+        proof = self.cache.get(key)
+        if proof is not None:
+            # 较浅的必胜在更深的限制下依然成立，较深的不胜在更浅的限制下依然成立
+            win_depth, move, no_win_depth = proof
+            if win_depth is not None and win_depth <= depth:
+                self.cache.move_to_end(key)
+                return from_canonical(self.board, symmetry, move)
+            if no_win_depth >= depth:
+                self.cache.move_to_end(key)
+                return None
+
+        # 守方已经有成五点时，攻方只能去挡，并且挡的这一手必须同时是威胁
+        defender_scores = self.board.scores[1 - attacker]
+        blocks = [cell for cell in self.board.frontier if defender_scores[cell] >= five]
+        cells = blocks if blocks else self.board.frontier
+        threats = []
+        if len(blocks) <= 1:
+            for cell in cells:
+                threat = self.classify_threat(cell, attacker, use_threes)
+                if threat is not None:
+                    threats.append(threat)
+        # 先试冲四，再按静态分试活三
+        threats.sort(key=lambda threat: (threat[1], attacker_scores[threat[0]]), reverse=True)
+
+        result = None
+        color = COLORS[attacker]
+        for threat in threats:
+            row, col = divmod(threat[0], self.board.size)
+            self.board.place(row, col, color)
+            won = self.defend(attacker, use_threes, depth, *threat)
+            self.board.remove(row, col)
+            if won:
+                result = (row, col)
+                break
+
+        self.store(key, depth, None if result is None else to_canonical(self.board, symmetry, *result))
+        return result
+
+    def defend(self, attacker, use_threes, depth, cell, is_four, direction):
+        """守方结点：攻方刚在cell落下威胁子，守方的所有应对都失败时返回True"""
+        self.count_node()
+        defender = 1 - attacker
+        five = SCORES['five']
+        attacker_scores = self.board.scores[attacker]
+        cells = self.board.cells
+        line_neighbors = self.board.geometry.line_neighbors[cell]
+
+        # 攻方的成五点只可能在新子所在的四条线上
+        gains = set()
+        for line in line_neighbors:
+            for other, _ in line:
+                if cells[other] is None and attacker_scores[other] >= five:
+                    gains.add(other)
+        if len(gains) >= 2:  # 活四或双四，挡不住
+            return True
+        if gains:
+            defenses = list(gains)
+        elif is_four or not use_threes:
+            return False
+        else:
+            # 活三：可以挡在攻方能成四的点上，也可以自己冲四反击
+            attacker_patterns = self.board.patterns[attacker]
+            defenses = [other for other, _ in line_neighbors[direction]
+                        if cells[other] is None and
+                        PATTERN_FLAGS[attacker_patterns[other * 4 + direction]] & PAT_ANY_FOUR]
+            defender_patterns = self.board.patterns[defender]
+            for other in self.board.frontier:
+                if other not in defenses and any(
+                        PATTERN_FLAGS[defender_patterns[other * 4 + other_direction]] & PAT_ANY_FOUR
+                        for other_direction in range(4)):
+                    defenses.append(other)
+            if not defenses:
+                return False
+
+        color = COLORS[defender]
+        for other in defenses:
+            row, col = divmod(other, self.board.size)
+            self.board.place(row, col, color)
+            result = self.attack(attacker, use_threes, depth - 1)
+            self.board.remove(row, col)
+            if result is None:
+                return False
+        return True
+
+def check_vcf(board, row, col, color, solver=None):
+    """检查从(row, col)开始能否实施VCF战术(连续冲四)"""
+    return (solver or ThreatSolver(board)).check_move(row, col, color, 'vcf')
+
+def check_vct(board, row, col, color, solver=None):
+    """检查从(row, col)开始能否实施VCT战术(冲四活三组合)"""
+    return (solver or ThreatSolver(board)).check_move(row, col, color, 'vct')
+
+def check_immediate_threat(board, row, col, color):
+    """检查是否有紧迫威胁（快要连五）"""
+    # 检查四个方向
+    for direction in range(4):
+        if board.run_length(row, col, direction, color) >= 4:  # 已经有四个连续棋子
+            return True
+    return False
+
+# NumPy批量评估：棋盘存成四周各补LINE_PAD格出界的int8数组，9格窗口在任何格子上都不会越界
+# 只有get_candidate_moves用到，搜索本身的着法排序和叶结点评估不经过这里
+GRID_EMPTY, GRID_BLACK, GRID_WHITE, GRID_EDGE = 0, 1, 2, 3
+GRID_CODES = {'black': GRID_BLACK, 'white': GRID_WHITE}
+
+def load_numpy():
+    """第一次批量评估时导入NumPy并建好数组常量"""
+    global np, as_strided, sliding_window_view
+    global GRID_RELATIVE, WINDOW_WEIGHTS, PATTERN_SCORE_ARRAY, PATTERN_FLAGS_ARRAY, PATTERN_CLASSIFIED
+    if np is not None:
+        return
+    import numpy
+    from numpy.lib.stride_tricks import as_strided, sliding_window_view
+    # 按颜色把格子编码换成窗口编码：0为空，1为己方，2为对方或出界
+    GRID_RELATIVE = numpy.array([[0, 1, 2, 2], [0, 2, 1, 2]], dtype=numpy.int8)
+    # 9格窗口第i格的3进制权，中心格不取数组里的值，查表时固定为己方
+    WINDOW_WEIGHTS = numpy.array([0 if i == LINE_PAD else 3 ** i for i in range(9)], dtype=numpy.int32)
+    PATTERN_SCORE_ARRAY = numpy.array(PATTERN_SCORE, dtype=numpy.int64)
+    PATTERN_FLAGS_ARRAY = numpy.array(PATTERN_FLAGS, dtype=numpy.int32)
+    PATTERN_CLASSIFIED = numpy.array([pattern_class is not None for pattern_class in PATTERN_CLASS])
+    np = numpy
+
+# 每种棋盘大小的(空棋盘数组, 位置分数组)
+grid_tables = {}
+
+def get_grid_tables(size):
+    """取某种棋盘大小的空棋盘数组（每次转换时复制一份再填入棋子）和与evaluate_position相同的位置分"""
+    tables = grid_tables.get(size)
+    if tables is None:
+        load_numpy()
+        empty = np.full((size + 2 * LINE_PAD,) * 2, GRID_EDGE, dtype=np.int8)
+        empty[LINE_PAD:-LINE_PAD, LINE_PAD:-LINE_PAD] = GRID_EMPTY
+        center_weight = get_geometry(size).center_weight
+        position_value = 150 * np.array([center_weight[index] for index in range(size * size)]).reshape(size, size)
+        tables = grid_tables[size] = empty, position_value
+    return tables
+
+def board_array(board):
+    """把棋盘转成int8数组：0空、1黑、2白、3出界，四周各补LINE_PAD格出界"""
+    grid = get_grid_tables(board.size)[0].copy()
+    if board.moves:
+        rows, cols = np.divmod(np.array(board.moves), board.size)
+        grid[rows + LINE_PAD, cols + LINE_PAD] = [GRID_CODES[board.cells[index]] for index in board.moves]
+    return grid
+
+def pattern_grids(grid):
+    """用跨步视图取出每个格子四个方向的9格窗口，一次换算出双方的棋型索引，形状为(颜色, 方向, 行, 列)"""
+    size = grid.shape[0] - 2 * LINE_PAD
+    relative = GRID_RELATIVE[:, grid]
+    plane, row_stride, col_stride = relative.strides
+    patterns = np.empty((2, 4, size, size), dtype=np.int32)
+    for direction, (dx, dy) in enumerate(DIRECTIONS):
+        # 窗口的第0格在(row - 4dx, col - 4dy)，视图的起点相应平移
+        start = relative[:, LINE_PAD - LINE_PAD * dx:, LINE_PAD - LINE_PAD * dy:]
+        windows = as_strided(start, shape=(2, size, size, 9),
+                             strides=(plane, row_stride, col_stride, dx * row_stride + dy * col_stride),
+                             writeable=False)
+        patterns[:, direction] = windows @ WINDOW_WEIGHTS
+    return patterns + 3 ** LINE_PAD
+
+def evaluate_grid(grid, color):
+    """一次算出全盘每格的进攻分和防守分（即evaluate_position的前两项），以及己方四个方向的特征位"""
+    color_index = COLOR_INDEX[color]
+    patterns = pattern_grids(grid)
+    own = patterns[color_index]
+    flags = PATTERN_FLAGS_ARRAY[own]
+    scores = PATTERN_SCORE_ARRAY[own]
+    bonus = PATTERN_CLASSIFIED[own] & (flags & PAT_THREE != 0)
+    # 逐方向累加并在连续三子时乘1.5，顺序与逐格评估相同，结果完全一致
+    attack = np.zeros(own.shape[1:])
+    for direction in range(4):
+        attack += scores[direction]
+        attack[bonus[direction]] *= 1.5
+    defense = PATTERN_SCORE_ARRAY[patterns[1 - color_index]].sum(axis=0)
+    return attack, defense, flags
+
+def get_candidate_moves_numpy(board, color, rng=random):
+    """用NumPy批量评估候选点，结果和随机数的消耗与逐格评估完全相同"""
+    load_numpy()
+    size = board.size
+    grid = board_array(board)
+    inner = grid[LINE_PAD:-LINE_PAD, LINE_PAD:-LINE_PAD]
+    occupied = inner != GRID_EMPTY
+    # 候选点：周围(2*SEARCH_RANGE+1)见方内有棋子的空位，按行优先的顺序
+    # 方框可以分解为先按行再按列的两次一维滑动窗口
+    width = 2 * SEARCH_RANGE + 1
+    near = sliding_window_view(np.pad(occupied, ((SEARCH_RANGE, SEARCH_RANGE), (0, 0))), width, axis=0).any(axis=2)
+    near = sliding_window_view(np.pad(near, ((0, 0), (SEARCH_RANGE, SEARCH_RANGE))), width, axis=1).any(axis=2)
+    rows, cols = np.nonzero(near & ~occupied)
+
+    attack, defense, flags = evaluate_grid(grid, color)
+    # 周围8格中的空位数（出界不算）
+    empty = grid == GRID_EMPTY
+    free = sum(empty[LINE_PAD + i:LINE_PAD + i + size, LINE_PAD + j:LINE_PAD + j + size].astype(np.int8)
+               for i in (-1, 0, 1) for j in (-1, 0, 1) if i or j)
+    flags = flags[:, rows, cols]
+    continuous = ((flags & (PAT_FOUR | PAT_LIVE_THREE | PAT_THREE)) != 0).sum(axis=0) >= 2
+    offensive = ((flags & (PAT_LIVE_THREE | PAT_SLEEP_THREE | PAT_THREE)) != 0).any(axis=0)
+    flexible = free[rows, cols] >= 4
+
+    # 随机权重逐格按evaluate_position的顺序抽取，其余计算都是整组进行
+    if board.stone_count() < size * 2:
+        ranges = ((1.3, 1.7), (0.8, 1.2), (0.8, 1.2))
+    else:
+        ranges = ((0.6, 0.9), (1.2, 1.5), (1.1, 1.4))
+    # 与rng.uniform(low, high)的算法相同：low + (high - low) * random()
+    draw = rng.random
+    weights = [[], [], []]
+    bonuses = [[], [], []]
+    bonus_ranges = ((1.2, 1.4), (1.1, 1.3), (1.1, 1.2))
+    for features in zip(continuous.tolist(), offensive.tolist(), flexible.tolist()):
+        for k, (low, high) in enumerate(ranges):
+            weights[k].append(low + (high - low) * draw())
+        for k, (low, high) in enumerate(bonus_ranges):
+            bonuses[k].append(low + (high - low) * draw() if features[k] else 1.0)
+    position_weight, attack_weight, defense_weight = np.array(weights)
+    bonuses = np.array(bonuses)
+    scores = (attack[rows, cols] * attack_weight + defense[rows, cols] * defense_weight +
+              get_grid_tables(size)[1][rows, cols] * position_weight)
+    scores = scores * bonuses[0] * bonuses[1] * bonuses[2]
+
+    moves = sorted(zip(scores.tolist(), rows.tolist(), cols.tolist()), reverse=True)
+    return [(row, col) for _, row, col in moves[:15]]  # 只考虑最佳的15个位置
+
+def get_candidate_moves(board, color, rng=random, vectorized=None):
+    """优化候选移动生成；vectorized为None时装有NumPy且不是大棋盘就批量评估"""
+    if vectorized is None:
+        # 批量评估的开销与棋盘面积成正比，大棋盘上逐格评估候选点更快
+        vectorized = NUMPY_AVAILABLE and not board.sparse
+    if vectorized and board.moves:
+        return get_candidate_moves_numpy(board, color, rng)
+    moves = []
+    opponent = 'black' if color == 'white' else 'white'
+    
+    # 如果棋盘为空，返回中心点
+    if not board.moves:
+        center = board.size // 2
+        return [(center, center)]
+    
+    # 在已有棋子周围寻找候选点
+    cells = board.cells
+    neighbors = board.geometry.neighbors[SEARCH_RANGE]
+    candidates = set()
+    for index in board.moves:
+        for cell in neighbors[index]:
+            if cells[cell] is None:
+                candidates.add(divmod(cell, board.size))
+    
+    # 按行优先的顺序评估每个候选点，随机数的消耗顺序与批量评估一致
+    for row, col in sorted(candidates):
+        score = evaluate_position(board, row, col, color, rng)
+        moves.append((score, row, col))
+    
+    # 按分数降序排序，只返回前N个最佳候选点
+    moves.sort(reverse=True)
+    return [(row, col) for _, row, col in moves[:15]]  # 只考虑最佳的15个位置
+
+def check_live_four(board, row, col, color):
+    """检查是否可以形成活四"""
+    has_live_four = False
+    
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if flags & PAT_LIVE_FOUR:  # 活四
+            has_live_four = True
+            break
+    
+    return has_live_four
+
+def check_continuous_threat(board, row, col, color):
+    """检查是否能形成连续威胁"""
+    threat_count = 0
+    
+    # 检查四个方向
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        # 检查是否形成威胁
+        if (flags & PAT_FOUR or  # 冲四
+            flags & PAT_LIVE_THREE or  # 活三
+            flags & PAT_THREE):  # 连续三子
+            threat_count += 1
+    
+    return threat_count >= 2  # 至少有两个方向形成威胁
+
+def check_offensive_pattern(board, row, col, color):
+    """检查是否能形成进攻态势"""
+    has_offensive = False
+    
+    # 检查是否能形成活三或更强的威胁
+    for dx, dy in DIRECTIONS:
+        flags = PATTERN_FLAGS[get_line_pattern(board, row, col, dx, dy, color)]
+        if (flags & PAT_LIVE_THREE or  # 活三
+            flags & PAT_SLEEP_THREE or  # 眠三
+            flags & PAT_THREE):  # 连续三子
+            has_offensive = True
+            break
+    
+    return has_offensive
+
+def check_flexibility(board, row, col, color):
+    """检查位置的灵活性"""
+    # 周围8个方向中有发展空间的数量
+    flexibility = board.free_neighbors(row, col)
+    return flexibility >= 4  # 至少有4个方向有发展空间
+
+# 搜索统计的全部字段
+SEARCH_STAT_KEYS = ('nodes', 'cutoffs', 'first_move_cutoffs', 'depth', 'threat_nodes', 'time',
+                    'leaves', 'expanded', 'tt_probes', 'tt_hits', 'tt_cutoffs', 'movegen_time', 'eval_time')
+
+def format_search_stats(stats):
+    """把一次搜索的统计整理成一行可读的摘要"""
+    nodes = stats['nodes']
+    parts = [f"depth {stats['depth']}", f'nodes {nodes}']
+    if stats['time']:
+        parts.append(f"{(nodes + stats['threat_nodes']) / stats['time']:.0f} nodes/s in {stats['time']:.3f}s")
+    if stats['cutoffs']:
+        parts.append(f"cutoffs {stats['cutoffs']} ({stats['first_move_cutoffs'] / stats['cutoffs']:.0%} on first move)")
+    if stats['expanded']:
+        parts.append(f"branching {(nodes - 1) / stats['expanded']:.1f}")
+    if stats['tt_probes']:
+        parts.append(f"tt hits {stats['tt_hits'] / stats['tt_probes']:.0%} (cutoffs {stats['tt_cutoffs']})")
+    if stats['movegen_time'] or stats['eval_time']:
+        parts.append(f"movegen {stats['movegen_time']:.3f}s eval (place/remove) {stats['eval_time']:.3f}s")
+    if stats['threat_nodes']:
+        parts.append(f"threat nodes {stats['threat_nodes']}")
+    return ', '.join(parts)
+
+def perft(board, depth, color='black'):
+    """沿着法生成器展开depth层，返回叶结点数；成五的着法不再展开，用来核对和测量着法生成"""
+    if depth == 0:
+        return 1
+    moves = get_valid_moves(board)
+    if depth == 1:
+        return len(moves)
+    opponent = 'black' if color == 'white' else 'white'
+    nodes = 0
+    for row, col in moves:
+        if board.makes_five(row, col, color):
+            nodes += 1
+            continue
+        board.place(row, col, color)
+        nodes += perft(board, depth - 1, opponent)
+        board.remove(row, col)
+    return nodes
+
+# 按内存上限分配缓存时每个条目大约占用的字节数（CPython实测）
+TT_ENTRY_BYTES = 150
+PROOF_ENTRY_BYTES = 240
+LINE_ENTRY_BYTES = 175
+MIN_CACHE_ENTRIES = 1 << 10  # 内存再紧也至少保留这么多条目
+
+class Engine:
+    """AI引擎：持有一个棋盘以及置换表、历史表、杀手着法等全部搜索状态"""
+
+    def __init__(self, time_limit=AI_TIME_LIMIT, max_depth=SEARCH_DEPTH, seed=None,
+                 workers=SEARCH_WORKERS, threat_time_limit=THREAT_TIME_LIMIT, collect_stats=False,
+                 book_path=BOOK_PATH, proof_path=None, board_size=BOARD_SIZE):
+        self.board = Board(board_size)
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.threat_time_limit = threat_time_limit  # 放宽后算杀只受结点数限制，结果可复现
+        # 开局库，文件不存在或book_path为None时不使用；自带的开局库只适用于默认大小的棋盘
+        if book_path == BOOK_PATH and board_size != BOARD_SIZE:
+            book_path = None
+        self.book = OpeningBook.load(book_path, board_size)
+        # 多于一个进程时，最后的限时搜索交给进程池做根结点并行
+        self.parallel = ParallelSearch(workers, board_size) if workers > 1 else None
+        self.random = random.Random(seed)  # 开局随机和评估权重使用独立的随机数生成器
+        # 置换表
+        self.transposition_table = TranspositionTable()
+        # 历史启发表
+        self.history_table = defaultdict(int)
+        # 杀手着法表：每层保留最近两个引起剪枝的着法
+        self.killer_moves = [[None, None] for _ in range(MAX_PLY)]
+        # 搜索统计：结点数、剪枝次数、第一个着法就剪枝的次数、最后完成的深度、算杀结点数、总用时
+        # 以及只在collect_stats打开时才收集的叶结点数、展开结点数、置换表命中、着法生成和评估用时
+        # 评估用时是落子和提子的用时，棋型和分数都在这两步里增量更新
+        self.collect_stats = collect_stats
+        self.search_stats = dict.fromkeys(SEARCH_STAT_KEYS, 0)
+        # 上一轮迭代的主要变例，用于下一轮的着法排序
+        self.principal_variation = []
+        # 每一轮完整迭代的(深度, 分数, 最佳着法)，分数以走棋一方视角计算
+        self.depth_results = []
+        # 本次搜索的截止时间，None表示不限时
+        self.search_deadline = None
+        # 停止信号：其他线程置位后，搜索和算杀在下一次检查时中止
+        self.stop_event = threading.Event()
+        # 算杀器
+        self.threat_solver = ThreatSolver(self.board, stop_event=self.stop_event)
+        # 证明缓存文件，创建时读入、关闭时写回；None表示只在内存中跨局保留
+        self.proof_path = proof_path
+        if proof_path is not None:
+            self.threat_solver.load(proof_path)
+
+    def new_game(self):
+        """清空棋盘和搜索缓存，开始新的一局；算杀的证明只依赖局面本身，跨局保留"""
+        self.board.reset()
+        self.transposition_table.clear()
+        self.history_table.clear()
+        self.killer_moves = [[None, None] for _ in range(MAX_PLY)]
+        self.principal_variation = []
+
+    def set_memory_limit(self, max_memory):
+        """按字节数上限调整置换表、证明缓存和整线评估缓存的大小，0表示使用默认大小
+
+        三者分别最多占上限的1/8、1/8和1/4，其余留给解释器和棋盘表；整线评估缓存是整个进程共用的
+        """
+        global LINE_CACHE_LIMIT
+        tt_size, proof_size, line_size = TT_SIZE, THREAT_CACHE_SIZE, LINE_CACHE_SIZE
+        if max_memory:
+            tt_size = min(TT_SIZE, max(MIN_CACHE_ENTRIES, max_memory // 8 // TT_ENTRY_BYTES))
+            tt_size = 1 << (tt_size.bit_length() - 1)  # 置换表槽数必须是2的幂
+            proof_size = min(THREAT_CACHE_SIZE, max(MIN_CACHE_ENTRIES, max_memory // 8 // PROOF_ENTRY_BYTES))
+            line_size = min(LINE_CACHE_SIZE, max(MIN_CACHE_ENTRIES, max_memory // 4 // LINE_ENTRY_BYTES))
+        if tt_size != self.transposition_table.mask + 1:
+            self.transposition_table = TranspositionTable(tt_size)
+        cache = self.threat_solver.cache
+        self.threat_solver.cache_size = proof_size
+        while len(cache) > proof_size:
+            cache.popitem(last=False)
+        LINE_CACHE_LIMIT = line_size
+        if len(line_value_cache) > line_size:
+            line_value_cache.clear()
+
+    def stop(self):
+        """请求正在进行的搜索尽快结束，可以从其他线程调用"""
+        self.stop_event.set()
+
+    def set_position(self, moves):
+        """让引擎棋盘与给定的落子序列[(row, col, color)]一致，相同的前缀不重新落子"""
+        own = self.board
+        history = own.history()
+        common = 0
+        while common < len(history) and common < len(moves) and history[common] == tuple(moves[common]):
+            common += 1
+        while len(own.moves) > common:
+            own.undo()
+        for row, col, color in moves[common:]:
+            own.place(row, col, color)
+
+    def close(self):
+        """关闭并行搜索的进程池和开局库，并写回证明缓存"""
+        if self.proof_path is not None:
+            self.threat_solver.save(self.proof_path)
+        if self.parallel is not None:
+            self.parallel.close()
+        if self.book is not None:
+            self.book.close()
+
+    def record_cutoff(self, move, depth, ply, move_number):
+        """记录引起剪枝的着法：更新历史表、杀手着法和统计"""
+        self.history_table[move] += depth * depth
+        if ply < MAX_PLY:
+            killers = self.killer_moves[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.search_stats['cutoffs'] += 1
+        if move_number == 0:
+            self.search_stats['first_move_cutoffs'] += 1
+
+    def iterative_deepening_search(self, color='white', max_depth=None, time_limit=None, root_moves=None):
+        """限时迭代加深搜索，返回最后一轮完整迭代的最佳着法；root_moves限定根结点只搜索这些着法"""
+        if max_depth is None:
+            max_depth = self.max_depth
+        if time_limit is None:
+            time_limit = self.time_limit
+        board = self.board
+        best_move = None
+        scores = []
+        self.transposition_table.new_search()
+        self.reset_search_stats()
+        self.principal_variation = []
+        self.depth_results = []
+        start_time = time.perf_counter()
+        self.search_deadline = start_time + time_limit
+        moves_before = len(board.moves)
+        
+        try:
+            for depth in range(1, max_depth + 1):
+                # 奇数层和偶数层的分数差得较多，窗口以两轮之前同奇偶的分数为中心
+                score, move = self.aspiration_search(depth, scores[-2] if len(scores) >= 2 else None,
+                                                     color, root_moves)
+                scores.append(score)
+                if move:
+                    best_move = move
+                    self.search_stats['depth'] = depth
+                    self.depth_results.append((depth, score, move))
+                self.principal_variation = self.get_principal_variation(color, depth)
+                # 已经算出必胜或必败，再加深也不会改变结果
+                if abs(score) >= WIN_SCORE - MAX_PLY:
+                    break
+                # 已用掉一半时间时，下一轮基本不可能完成
+                if time.perf_counter() - start_time > time_limit / 2:
+                    break
+        except SearchTimeout:
+            # 撤销被中断的那一轮留在棋盘上的试探落子
+            while len(board.moves) > moves_before:
+                board.undo()
+        finally:
+            self.search_deadline = None
+        
+        # 连第一轮都没有完成时，取排序后的第一个着法
+        if best_move is None:
+            moves = self.order_moves(root_moves or get_valid_moves(board), color, 0)
+            best_move = moves[0] if moves else None
+        return best_move
+
+    def aspiration_search(self, depth, center, color, root_moves=None):
+        """以center为中心开窗口搜索，分数落在窗口外时把失败的一侧放宽后重搜"""
+        alpha, beta = float('-inf'), float('inf')
+        # 没有中心分数或已经算出胜负时用完整窗口
+        if center is not None and abs(center) < WIN_SCORE - MAX_PLY:
+            alpha, beta = center - ASPIRATION_WINDOW, center + ASPIRATION_WINDOW
+        delta = ASPIRATION_WINDOW
+        while True:
+            score, move = self.negamax(depth, alpha, beta, color, root_moves=root_moves)
+            # 胜负分不在窗口能逐步覆盖的范围内，直接打开失败的一侧
+            delta *= 4
+            if score <= alpha and alpha > float('-inf'):
+                alpha = score - delta if abs(score) < WIN_SCORE - MAX_PLY else float('-inf')
+            elif score >= beta and beta < float('inf'):
+                beta = score + delta if abs(score) < WIN_SCORE - MAX_PLY else float('inf')
+            else:
+                return score, move
+
+    def get_principal_variation(self, color, max_length):
+        """沿置换表中的最佳着法取出主要变例"""
+        board = self.board
+        pv = []
+        while len(pv) < max_length:
+            canonical, symmetry = board.canonical()
+            entry = self.transposition_table.probe(canonical ^ (board.zobrist_side if color == 'white' else 0))
+            if entry is None or entry[4] is None:
+                break
+            row, col = from_canonical(board, symmetry, entry[4])
+            if board.get(row, col) is not None:
+                break
+            pv.append((row, col))
+            board.place(row, col, color)
+            color = 'black' if color == 'white' else 'white'
+        for _ in pv:
+            board.undo()
+        return pv
+
+    def order_moves(self, moves, color, ply, hash_move=None):
+        """着法排序：置换表着法、成五、挡五、杀手着法，其余按历史分和静态棋型分"""
+        color_index = COLOR_INDEX[color]
+        own_scores = self.board.scores[color_index]
+        opponent_scores = self.board.scores[1 - color_index]
+        killers = self.killer_moves[ply] if ply < MAX_PLY else ()
+        history_table = self.history_table
+        five = SCORES['five']
+        size = self.board.size
+        
+        def move_key(move):
+            index = move[0] * size + move[1]
+            if move == hash_move:
+                tier = 5
+            elif own_scores[index] >= five:  # 落子成五
+                tier = 4
+            elif opponent_scores[index] >= five:  # 挡住对方成五
+                tier = 3
+            elif move in killers:
+                tier = 2
+            else:
+                tier = 0
+            return tier, history_table.get(move, 0), own_scores[index] + opponent_scores[index]
+        
+        return sorted(moves, key=move_key, reverse=True)
+
+    def reset_search_stats(self):
+        """清零搜索统计"""
+        for name in self.search_stats:
+            self.search_stats[name] = 0
+
+    def negamax(self, depth, alpha, beta, color, ply=0, root_moves=None):
+        """Negamax形式的主要变例搜索（PVS），分数以color（走棋一方）视角计算
+
+        第一个着法用完整窗口搜索，其余着法先用零窗口证明不比它好，失败时再用完整窗口重搜
+        """
+        board = self.board
+        search_stats = self.search_stats
+        collect = self.collect_stats
+        search_stats['nodes'] += 1
+        if (self.search_deadline is not None and search_stats['nodes'] & 255 == 0 and
+                (time.perf_counter() > self.search_deadline or self.stop_event.is_set())):
+            raise SearchTimeout
+        if depth == 0:
+            if collect:
+                search_stats['leaves'] += 1
+            return evaluate_board(board, color), None
+        
+        # 查询置换表；根着法受限时结果只对这部分着法成立，不读写置换表
+        # 置换表按规范化键索引，着法存规范化方向的格子编号，分数是走棋一方视角
+        canonical, symmetry = board.canonical()
+        key = canonical ^ (board.zobrist_side if color == 'white' else 0)
+        entry = self.transposition_table.probe(key) if root_moves is None else None
+        if collect and root_moves is None:
+            search_stats['tt_probes'] += 1
+            if entry is not None:
+                search_stats['tt_hits'] += 1
+        if entry is not None:
+            _, entry_depth, flag, score, hash_move, _ = entry
+            if hash_move is not None:
+                hash_move = from_canonical(board, symmetry, hash_move)
+            if entry_depth >= depth:
+                if flag == TT_EXACT:
+                    if collect:
+                        search_stats['tt_cutoffs'] += 1
+                    return score, hash_move
+                if flag == TT_LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if beta <= alpha:
+                    if collect:
+                        search_stats['tt_cutoffs'] += 1
+                    return score, hash_move
+        elif ply < len(self.principal_variation):
+            hash_move = self.principal_variation[ply]
+        else:
+            hash_move = None
+        alpha_orig = alpha
+        
+        if collect:
+            start_time = time.perf_counter()
+            valid_moves = self.order_moves(root_moves or get_valid_moves(board), color, ply, hash_move)
+            search_stats['movegen_time'] += time.perf_counter() - start_time
+            search_stats['expanded'] += 1
+        else:
+            valid_moves = self.order_moves(root_moves or get_valid_moves(board), color, ply, hash_move)
+        opponent = 'black' if color == 'white' else 'white'
+        own_scores = board.scores[COLOR_INDEX[color]]
+        win_score = WIN_SCORE - ply
+        best_eval = float('-inf')
+        best_move = None
+        
+        for move_number, (row, col) in enumerate(valid_moves):
+            if board.get(row, col) is not None or not board.has_neighbor(row, col):
+                continue
+            if own_scores[row * board.size + col] >= SCORES['five']:
+                eval = win_score  # 这一步直接成五
+            else:
+                # 评估在落子和提子时增量更新，统计时把这两步的用时记作评估用时
+                if collect:
+                    start_time = time.perf_counter()
+                    board.place(row, col, color)
+                    search_stats['eval_time'] += time.perf_counter() - start_time
+                else:
+                    board.place(row, col, color)
+                if best_move is None:
+                    eval = -self.negamax(depth - 1, -beta, -alpha, opponent, ply + 1)[0]
+                else:
+                    # 零窗口试探，分数落进(alpha, beta)说明这一步可能更好，用完整窗口重搜
+                    eval = -self.negamax(depth - 1, -alpha - 1, -alpha, opponent, ply + 1)[0]
+                    if alpha < eval < beta:
+                        eval = -self.negamax(depth - 1, -beta, -alpha, opponent, ply + 1)[0]
+                if collect:
+                    start_time = time.perf_counter()
+                    board.remove(row, col)
+                    search_stats['eval_time'] += time.perf_counter() - start_time
+                else:
+                    board.remove(row, col)
+            
+            if eval > best_eval:
+                best_eval = eval
+                best_move = (row, col)
+            
+            alpha = max(alpha, eval)
+            if beta <= alpha:
+                self.record_cutoff((row, col), depth, ply, move_number)
+                break
+        
+        if root_moves is not None:
+            return best_eval, best_move
+        
+        # 写入置换表
+        if best_eval <= alpha_orig:
+            flag = TT_UPPER
+        elif best_eval >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        self.transposition_table.store(key, depth, flag, best_eval,
+                                       None if best_move is None else to_canonical(board, symmetry, *best_move))
+        return best_eval, best_move
+
+    def get_ai_move(self, color):
+        """AI决策，同时把这一步的搜索统计和总用时留在search_stats中"""
+        start_time = time.perf_counter()
+        self.reset_search_stats()
+        move = self.choose_move(color, start_time + self.time_limit)
+        self.search_stats['time'] = time.perf_counter() - start_time
+        return move
+
+    def choose_move(self, color, deadline=None):
+        """AI决策：开局库、必胜必防，然后限时搜索；算杀和搜索都必须在deadline之前结束"""
+        if deadline is None:
+            deadline = time.perf_counter() + self.time_limit
+        board = self.board
+        valid_moves = get_valid_moves(board)
+        if not valid_moves:
+            return None
+            
+        # 检查开局阶段
+        piece_count = board.stone_count()
+        
+        # 开局库里有这个局面时直接查表，不再搜索
+        if self.book is not None and piece_count < BOOK_PLIES:
+            move = self.book.choose(board, self.random)
+            if move:
+                return move
+        
+        # 开局阶段使用开局库
+        if piece_count < 6:
+            # 第一手
+            if piece_count == 0:
+                center = board.size // 2
+                # 小棋盘上离中心较远的开局点会落到盘外或边上，只取盘内不在边上的
+                first_moves = [(center + row, center + col) for (row, col), *_ in OPENING_MOVES
+                               if 0 <= center + row < board.size and 0 <= center + col < board.size and
+                               not board.geometry.on_edge[(center + row) * board.size + center + col]]
+                return self.random.choice([move for first_move in first_moves
+                                           for move in symmetric_moves(board, *first_move)])
+            # 后续开局
+            elif piece_count < 6:
+                # 有30%概率下随机位置（增加变化）
+                if self.random.random() < 0.3:
+                    center = board.size // 2
+                    radius = self.random.randint(2, 4)
+                    candidates = []
+                    for row in range(max(0, center-radius), min(board.size, center+radius+1)):
+                        for col in range(max(0, center-radius), min(board.size, center+radius+1)):
+                            if board.get(row, col) is None and board.has_neighbor(row, col):
+                                candidates.append((row, col))
+                    if candidates:
+                        return self.random.choice(candidates)
+        
+        # 检查必胜和必防
+        opponent = 'black' if color == 'white' else 'white'
+        for row, col in valid_moves:
+            # 检查我方能否获胜
+            if board.makes_five(row, col, color):
+                return row, col
+                
+            # 检查对手能否获胜
+            if board.makes_five(row, col, opponent):
+                return row, col
+        
+        # 算杀：先找连续冲四，再找冲四活三组合，两者的用时都从这一步的时间里扣
+        threat_time_limit = min(self.threat_time_limit, self.time_limit * THREAT_SHARE)
+        move = self.threat_solver.solve(color, 'vcf', time_limit=threat_time_limit)
+        threat_nodes = self.threat_solver.nodes
+        if not move:
+            move = self.threat_solver.solve(color, 'vct', time_limit=threat_time_limit)
+            threat_nodes += self.threat_solver.nodes
+        if move:
+            self.search_stats['threat_nodes'] = threat_nodes
+            return move
+        
+        # 限时迭代加深搜索，只用剩下的时间
+        time_limit = max(0, deadline - time.perf_counter())
+        if self.parallel is not None:
+            move = self.parallel.search(self, color, time_limit=time_limit)
+        else:
+            move = self.iterative_deepening_search(color, time_limit=time_limit)
+        self.search_stats['threat_nodes'] = threat_nodes
+        return move
+
+# 进程池子进程中的引擎，每个子进程一个，跨任务保留置换表和历史表
+process_engine = None
+
+def init_search_process(board_size=BOARD_SIZE, stop_event=None, ready=None):
+    """进程池子进程的初始化函数：建好引擎后释放一次ready，父进程置位stop_event时搜索和算杀都会中止"""
+    global process_engine
+    # 子进程只搜索指定的根着法，不查开局库
+    process_engine = Engine(board_size=board_size, book_path=None)
+    if stop_event is not None:
+        process_engine.stop_event = process_engine.threat_solver.stop_event = stop_event
+    if ready is not None:
+        ready.release()
+
+def search_root_moves(moves, color, root_moves, max_depth, time_limit):
+    """进程池任务：在子进程的引擎上只搜索指定的根着法，返回(每一轮完整迭代的(深度, 分数, 着法), 结点数)"""
+    process_engine.set_position(moves)
+    process_engine.iterative_deepening_search(color, max_depth, time_limit, root_moves)
+    return process_engine.depth_results, process_engine.search_stats['nodes']
+
+def merge_root_results(results, root_moves):
+    """合并各进程的[(深度, 分数, 着法)]，返回(比较的深度, 最佳着法)，没有可比较的结果时着法为None
+
+    取所有进程都完成的最深一轮；某个进程的根着法已经证明必胜或必败时它提前停止加深，
+    这个结论对更深的轮次同样成立，先把它顺延到最深一轮，免得拖低其他进程的比较深度。
+    分数相同时按根着法的排序先后取，保证结果确定
+    """
+    deepest = max(len(result) for result in results)
+    results = [result + [result[-1]] * (deepest - len(result))
+               if result and abs(result[-1][1]) >= WIN_SCORE - MAX_PLY else result
+               for result in results]
+    depth = min(len(result) for result in results)
+    if depth == 0:
+        return 0, None
+    order = {move: i for i, move in enumerate(root_moves)}
+    best = min((result[depth - 1] for result in results), key=lambda entry: (-entry[1], order[entry[2]]))
+    return depth, best[2]
+
+class ParallelSearch:
+    """根结点并行搜索：把排好序的根着法轮流分给各个进程，各自迭代加深后确定性地合并"""
+
+    def __init__(self, workers=None, board_size=BOARD_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        # 用spawn启动子进程：调用方可能在后台线程里，fork带线程的进程不安全
+        context = get_context('spawn')
+        # 跨进程的停止信号和子进程就绪计数
+        self.stop_event = context.Event()
+        self.ready = context.Semaphore(0)
+        self.starting = self.workers  # 还没有报告就绪的子进程数
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=init_search_process,
+                                            initargs=(board_size, self.stop_event, self.ready))
+        # 子进程要等到提交任务时才启动，先提交空任务让它们在创建引擎时就在后台启动，不占第一步的思考时间
+        for _ in range(self.workers):
+            self.executor.submit(int)
+
+    def close(self):
+        """中止子进程里的搜索并关闭进程池"""
+        if self.executor is not None:
+            self.stop_event.set()
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def wait_ready(self, stop_event):
+        """等所有子进程建好引擎，返回是否都已就绪；stop_event被置位或进程池已损坏时返回False"""
+        while self.starting:
+            if stop_event.is_set() or self.broken():
+                return False
+            if self.ready.acquire(timeout=0.01):
+                self.starting -= 1
+        return True
+
+    def broken(self):
+        """进程池是否已损坏：子进程初始化失败或意外退出后，再提交任务会抛出BrokenProcessPool"""
+        try:
+            self.executor.submit(int)
+        except BrokenProcessPool:
+            return True
+        return False
+
+    def drain(self, futures):
+        """中止已提交的任务：还没开始的取消，正在运行的置位停止信号后等它们结束"""
+        for future in futures:
+            future.cancel()
+        self.stop_event.set()
+        wait(futures)
+        self.stop_event.clear()
+
+    def search(self, engine, color, max_depth=None, time_limit=None):
+        """为color一方搜索engine棋盘上的最佳着法，结果只取所有进程都完成的最深一轮"""
+        if max_depth is None:
+            max_depth = engine.max_depth
+        if time_limit is None:
+            time_limit = engine.time_limit
+        board = engine.board
+        root_moves = engine.order_moves(
+            [move for move in get_valid_moves(board) if board.has_neighbor(*move)], color, 0)
+        if len(root_moves) < 2:
+            return root_moves[0] if root_moves else engine.iterative_deepening_search(color, max_depth, time_limit)
+        # 进程池还在启动时，等待的时间从这一步的时间里扣除
+        start_time = time.perf_counter()
+        ready = self.wait_ready(engine.stop_event)
+        time_limit = max(0, time_limit - (time.perf_counter() - start_time))
+        if engine.stop_event.is_set():
+            return root_moves[0]
+        if not ready or self.broken():
+            # 进程池不可用时退回单进程搜索
+            return engine.iterative_deepening_search(color, max_depth, time_limit)
+        moves = board.history()
+        groups = [root_moves[i::self.workers] for i in range(min(self.workers, len(root_moves)))]
+        futures = [self.executor.submit(search_root_moves, moves, color, group, max_depth, time_limit)
+                   for group in groups]
+        # 等待期间响应停止信号
+        pending = futures
+        while pending:
+            if engine.stop_event.is_set():
+                self.drain(pending)
+                return root_moves[0]
+            _, pending = wait(pending, timeout=0.01, return_when=FIRST_EXCEPTION)
+        results = []
+        for future in futures:
+            depth_results, nodes = future.result()
+            results.append(depth_results)
+            engine.search_stats['nodes'] += nodes
+        
+        depth, move = merge_root_results(results, root_moves)
+        if move is None:
+            return root_moves[0]
+        engine.search_stats['depth'] = depth
+        return move
+
+class SearchWorker:
+    """在后台线程中运行AI搜索，主循环每帧轮询结果，随时可以取消"""
+
+    def __init__(self, engine=None):
+        self.engine = engine or Engine()
+        self.thread = None
+        self.result = None
+
+    def start(self, board, color):
+        """取消正在进行的搜索，然后在后台为color一方计算下一手"""
+        self.cancel()
+        self.engine.set_position(board.history())
+        self.engine.stop_event.clear()
+        self.result = None
+        self.thread = threading.Thread(target=self.run, args=(color,), daemon=True)
+        self.thread.start()
+
+    def run(self, color):
+        """后台线程入口"""
+        self.result = self.engine.get_ai_move(color)
+
+    def busy(self):
+        """是否有尚未取走结果的搜索"""
+        return self.thread is not None
+
+    def poll(self):
+        """搜索完成时返回(True, 着法)并清除状态，否则返回(False, None)"""
+        if self.thread is None or self.thread.is_alive():
+            return False, None
+        self.thread = None
+        return True, self.result
+
+    def wait(self):
+        """等待后台搜索结束并取走结果，没有正在进行的搜索时返回(False, None)"""
+        if self.thread is not None:
+            self.thread.join()
+        return self.poll()
+
+    def cancel(self):
+        """中止正在进行的搜索并等待线程退出，丢弃结果"""
+        if self.thread is not None:
+            self.engine.stop()
+            self.thread.join()
+            self.thread = None
+        self.result = None
+
+class Ponderer:
+    """对手思考时在后台预测对方最可能的几种着法，逐个预先算好应手；与SearchWorker共用引擎时不能同时运行"""
+
+    def __init__(self, engine, moves=PONDER_MOVES):
+        self.engine = engine
+        self.moves = moves
+        self.thread = None
+        self.lock = threading.Lock()
+        self.replies = {}     # 预测的对方着法 -> (应手, 搜索统计)
+        self.current = None   # 正在为哪个预测着法搜索应手
+        self.played = None    # 对方实际下的着法，下出之前为None
+        self.stats = None     # 最后一次poll取走的应手的搜索统计
+
+    def start(self, board, color):
+        """轮到对方走时调用：在后台为color一方预先计算对方各种可能着法的应手"""
+        self.cancel()
+        self.engine.set_position(board.history())
+        self.engine.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, args=(color,), daemon=True)
+        self.thread.start()
+
+    def predict(self, color):
+        """预测对方的着法：上一次搜索主要变例中的应手排在最前，其余按着法排序取前几个"""
+        engine = self.engine
+        opponent = 'black' if color == 'white' else 'white'
+        moves = []
+        pv = engine.principal_variation
+        if len(pv) >= 2 and engine.board.moves and pv[0] == divmod(engine.board.moves[-1], engine.board.size):
+            moves.append(pv[1])
+        for move in engine.order_moves(get_valid_moves(engine.board), opponent, 0):
+            if len(moves) >= self.moves:
+                break
+            if move not in moves:
+                moves.append(move)
+        return opponent, moves[:self.moves]
+
+    def run(self, color):
+        """后台线程入口：依次假设对方下每个预测着法，为color一方完整搜索一次，置换表和历史表随之预热"""
+        engine = self.engine
+        board = engine.board
+        opponent, moves = self.predict(color)
+        for move in moves:
+            with self.lock:
+                if self.played is not None or engine.stop_event.is_set():
+                    break
+                self.current = move
+            board.place(*move, opponent)
+            reply = engine.get_ai_move(color)
+            board.remove(*move)
+            with self.lock:
+                # 被取消而中止的搜索结果不完整，不保留
+                if not engine.stop_event.is_set():
+                    self.replies[move] = (reply, dict(engine.search_stats))
+                self.current = None
+
+    def play(self, row, col):
+        """对方实际下了(row, col)：只保留这一手的结果，正在为它搜索时让搜索继续，否则丢弃全部预先计算"""
+        with self.lock:
+            self.played = (row, col)
+            keep = self.played in self.replies or self.played == self.current
+            if keep and self.played in self.replies:
+                # 应手已经算好，停掉之后对其他着法的预先计算
+                self.engine.stop()
+        if not keep:
+            self.cancel()
+        elif self.thread is not None and self.played in self.replies:
+            self.thread.join()
+
+    def busy(self):
+        """是否还在为对方实际下的着法搜索应手"""
+        return self.played is not None and self.thread is not None and self.thread.is_alive()
+
+    def wait(self):
+        """阻塞到为对方实际下的着法进行的搜索结束，之后poll即可取走应手"""
+        if self.busy():
+            self.thread.join()
+
+    def poll(self):
+        """对方实际下的着法猜中且应手已经算好时返回(True, 应手)并清除状态，否则返回(False, None)"""
+        if self.busy():
+            return False, None
+        with self.lock:
+            result = self.replies.get(self.played) if self.played is not None else None
+        if result is None:
+            return False, None
+        self.reset()
+        move, self.stats = result
+        return True, move
+
+    def reset(self):
+        """清除预先计算的全部结果"""
+        self.thread = None
+        self.replies = {}
+        self.current = None
+        self.played = None
+
+    def cancel(self):
+        """中止预先计算并等待线程退出，丢弃全部结果"""
+        if self.thread is not None:
+            self.engine.stop()
+            self.thread.join()
+        self.reset()
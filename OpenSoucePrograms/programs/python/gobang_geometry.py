@@ -0,0 +1,156 @@
+"""棋盘几何：线、邻域、对称变换和中心距离表，每种棋盘大小只建一次，引擎各处共用"""
+from math import sqrt
+
+# 方向
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+LINE_PAD = 4               # 每条线两端各留4位空位作为边界，9格窗口移位时不会越界
+NEIGHBOR_RADII = (1, 2, 4)  # 预先算好的方形邻域半径
+SPARSE_SIZE = 32           # 超过这个大小的棋盘按格子懒惰建表，内存和建表时间与面积无关
+
+# 8种对称变换，每种的逆变换编号
+SYMMETRY_INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+
+class LazyTable(dict):
+    """按格子编号懒惰建表：第一次读到某个格子时才算出并记住，只占用用到过的格子"""
+
+    def __init__(self, build):
+        super().__init__()
+        self.build = build
+
+    def __missing__(self, index):
+        value = self[index] = self.build(index)
+        return value
+
+def build_line_masks(size):
+    """每条线的边界掩码和方向；线编号依次为竖线、横线、主对角线和副对角线"""
+    lengths = [(0, size)] * size + [(1, size)] * size
+    lengths += [(2, size - abs(d)) for d in range(-(size - 1), size)]
+    lengths += [(3, size - abs(s - (size - 1))) for s in range(2 * size - 1)]
+    pad = (1 << LINE_PAD) - 1
+    edge_masks = tuple(pad | (pad << (length + LINE_PAD)) for _, length in lengths)
+    line_directions = tuple(direction for direction, _ in lengths)
+    return edge_masks, line_directions
+
+def cell_line_entries(size, index):
+    """一个格子在四个方向上所属的(线编号, 位)，位是格子在线上的位置加LINE_PAD"""
+    row, col = divmod(index, size)
+    return (
+        (col, row + LINE_PAD),
+        (size + row, col + LINE_PAD),
+        (3 * size - 1 + row - col, min(row, col) + LINE_PAD),
+        (4 * size - 1 + row + col, min(row, size - 1 - col) + LINE_PAD),
+    )
+
+def cell_line_neighbors(size, index):
+    """一个格子在各方向前后4格内（不含自身、已裁掉出界部分）的(格子, 位)，按位从小到大"""
+    row, col = divmod(index, size)
+    neighbors = []
+    for (dx, dy), (_, bit) in zip(DIRECTIONS, cell_line_entries(size, index)):
+        neighbors.append(tuple(
+            ((row + k * dx) * size + col + k * dy, bit + k)
+            for k in range(-4, 5)
+            if k and 0 <= row + k * dx < size and 0 <= col + k * dy < size
+        ))
+    return tuple(neighbors)
+
+def build_line_cells(size, cell_lines, line_count):
+    """每条线上的全部(格子, 位)，只有稠密棋盘清空时逐线重算才用到"""
+    line_cells = [[] for _ in range(line_count)]
+    for index in range(size * size):
+        for line_id, bit in cell_lines[index]:
+            line_cells[line_id].append((index, bit))
+    return tuple(map(tuple, line_cells))
+
+def cell_neighborhood(size, radius, index):
+    """一个格子周围radius格见方内（不含自身、已裁掉出界部分）的格子和曼哈顿距离，按行优先排列"""
+    row, col = divmod(index, size)
+    near = []
+    steps = []
+    for i in range(-radius, radius + 1):
+        for j in range(-radius, radius + 1):
+            if (i or j) and 0 <= row + i < size and 0 <= col + j < size:
+                near.append((row + i) * size + col + j)
+                steps.append(abs(i) + abs(j))
+    return tuple(near), tuple(steps)
+
+def cell_center(size, index):
+    """一个格子到中心的欧氏距离、归一化的中心权重（中心为1，角上为0）、曼哈顿距离和是否在边上"""
+    row, col = divmod(index, size)
+    center = size // 2
+    distance = sqrt((row - center) ** 2 + (col - center) ** 2)
+    weight = 1 - distance / (center * sqrt(2))
+    manhattan = abs(row - center) + abs(col - center)
+    on_edge = row in (0, size - 1) or col in (0, size - 1)
+    return distance, weight, manhattan, on_edge
+
+def symmetric_index(size, symmetry, index):
+    """一个格子在第symmetry种旋转或翻转下的编号"""
+    last = size - 1
+    row, col = divmod(index, size)
+    if symmetry == 1:    # 顺时针旋转90度
+        row, col = col, last - row
+    elif symmetry == 2:  # 旋转180度
+        row, col = last - row, last - col
+    elif symmetry == 3:  # 逆时针旋转90度
+        row, col = last - col, row
+    elif symmetry == 4:  # 左右翻转
+        col = last - col
+    elif symmetry == 5:  # 沿主对角线翻转
+        row, col = col, row
+    elif symmetry == 6:  # 上下翻转
+        row = last - row
+    elif symmetry == 7:  # 沿副对角线翻转
+        row, col = last - col, last - row
+    return row * size + col
+
+class Geometry:
+    """一种棋盘大小的全部几何表，格子编号为row * size + col
+
+    按格子索引的表在稠密棋盘上是预先建好的元组，在大棋盘上是LazyTable，两者的读法相同
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.sparse = size > SPARSE_SIZE
+        # 线：每条线的边界掩码和方向、每格四个方向的(线编号, 位)、每格各方向前后4格
+        self.edge_masks, self.line_directions = build_line_masks(size)
+        self.cell_lines = self.table(lambda index: cell_line_entries(size, index))
+        self.line_neighbors = self.table(lambda index: cell_line_neighbors(size, index))
+        self.line_cells = None if self.sparse else build_line_cells(size, self.cell_lines, len(self.edge_masks))
+        # 邻域：neighbors[半径][格子]和对应的曼哈顿距离
+        self.neighbors = {}
+        self.neighbor_distances = {}
+        for radius in NEIGHBOR_RADII:
+            if self.sparse:
+                neighborhoods = self.table(lambda index, radius=radius: cell_neighborhood(size, radius, index))
+                self.neighbors[radius] = self.table(lambda index, table=neighborhoods: table[index][0])
+                self.neighbor_distances[radius] = self.table(lambda index, table=neighborhoods: table[index][1])
+            else:
+                cells, distances = zip(*(cell_neighborhood(size, radius, index) for index in range(size * size)))
+                self.neighbors[radius], self.neighbor_distances[radius] = cells, distances
+        # 中心距离和是否在棋盘边上
+        centers = self.table(lambda index: cell_center(size, index))
+        self.center_distance, self.center_weight, self.center_manhattan, self.on_edge = (
+            self.table(lambda index, field=field: centers[index][field]) for field in range(4))
+        # 8种对称变换的映射表，逆映射就是逆变换的映射表
+        self.symmetry_maps = tuple(self.table(lambda index, symmetry=symmetry: symmetric_index(size, symmetry, index))
+                                   for symmetry in range(8))
+        self.symmetry_inverses = tuple(self.symmetry_maps[inverse] for inverse in SYMMETRY_INVERSE)
+
+    def table(self, build):
+        """按格子编号建表：稠密棋盘一次算出所有格子，大棋盘读到哪个格子才算哪个"""
+        if self.sparse:
+            return LazyTable(build)
+        return tuple(build(index) for index in range(self.size * self.size))
+
+# 已建好的几何表，按棋盘大小索引
+geometries = {}
+
+def get_geometry(size):
+    """取某种棋盘大小的几何表，第一次用到时才建表"""
+    geometry = geometries.get(size)
+    if geometry is None:
+        geometry = geometries[size] = Geometry(size)
+    return geometry
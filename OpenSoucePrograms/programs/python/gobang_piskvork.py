@@ -0,0 +1,235 @@
+"""Piskvork/Gomocup协议前端：从标准输入读命令、向标准输出回复着法，对手思考时预测对方着法并提前搜索应手"""
+import argparse
+import sys
+
+from gobang_engine import (AI_TIME_LIMIT, BOOK_PATH, COLORS, SEARCH_WORKERS, Board, Engine, Ponderer,
+                           SearchWorker, format_search_stats)
+
+ABOUT = 'name="OpenSourcePrograms Gobang", version="1.0"'
+
+# 时间分配
+MOVES_TO_GO = 20       # 按整局剩余时间分配时假定还要走的步数
+TIME_MARGIN = 0.1      # 每步留给进程通信和线程切换的余量（秒）
+MIN_MOVE_TIME = 0.05   # 再紧也至少思考这么久（秒）
+
+# BOARD命令里格子的归属
+FIELD_OWN = 1
+FIELD_OPPONENT = 2
+
+def parse_move(text, size):
+    """把协议里的"x,y"（x为列、y为行）转成(row, col)，格式不对或出界时抛出ValueError"""
+    x, y = (int(value) for value in text.split(',')[:2])
+    if not (0 <= x < size and 0 <= y < size):
+        raise ValueError(f'{x},{y} is outside the board')
+    return y, x
+
+def format_move(row, col):
+    """把(row, col)转成协议里的x,y"""
+    return f'{col},{row}'
+
+class PiskvorkBrain:
+    """协议状态：当前对局的棋盘、引擎、后台搜索和预先计算、管理程序给的时间和内存限制"""
+
+    def __init__(self, output=sys.stdout, ponder=True, workers=SEARCH_WORKERS, book_path=BOOK_PATH):
+        self.output = output
+        self.ponder = ponder
+        self.workers = workers
+        self.book_path = book_path
+        self.board = None
+        self.engine = None
+        self.worker = None
+        self.ponderer = None
+        # 管理程序通过INFO给出的限制：时间为秒，None表示没有给出，内存为字节，0表示不限
+        self.timeout_turn = None
+        self.timeout_match = None
+        self.time_left = None
+        self.max_memory = 0
+        # BOARD命令之后、DONE之前收到的(row, col, 归属)，不在BOARD块中时为None
+        self.board_fields = None
+
+    def send(self, text):
+        """向管理程序写一行并立即刷新"""
+        self.output.write(text + '\n')
+        self.output.flush()
+
+    def handle(self, line):
+        """处理一行命令，收到END时返回False"""
+        line = line.strip()
+        if not line:
+            return True
+        if self.board_fields is not None:
+            self.read_board_line(line)
+            return True
+        command, _, argument = line.partition(' ')
+        command = command.upper()
+        argument = argument.strip()
+        try:
+            if command == 'END':
+                self.close()
+                return False
+            if command == 'START':
+                self.start(int(argument))
+            elif command == 'RECTSTART':
+                width, height = (int(value) for value in argument.split(','))
+                if width != height:
+                    raise ValueError('only square boards are supported')
+                self.start(width)
+            elif command == 'INFO':
+                self.info(*argument.split(None, 1))
+            elif command == 'ABOUT':
+                self.send(ABOUT)
+            elif self.board is None:
+                raise ValueError('START has not been received')
+            elif command == 'RESTART':
+                self.stop_pondering()
+                self.engine.new_game()
+                self.board.reset()
+                self.send('OK')
+            elif command == 'BEGIN':
+                self.stop_pondering()
+                self.play()
+            elif command == 'TURN':
+                self.turn(*parse_move(argument, self.board.size))
+            elif command == 'BOARD':
+                self.stop_pondering()
+                self.board_fields = []
+            elif command == 'TAKEBACK':
+                self.stop_pondering()
+                row, col = parse_move(argument, self.board.size)
+                self.board.remove(row, col)
+                self.send('OK')
+            else:
+                self.send(f'UNKNOWN {command}')
+        except (TypeError, ValueError) as error:
+            self.send(f'ERROR {error}')
+        return True
+
+    def start(self, size):
+        """START：按给定大小开始新的一局，重新创建引擎"""
+        if size < 5:
+            raise ValueError(f'unsupported board size {size}')
+        self.close()
+        self.board = Board(size)
+        self.engine = Engine(workers=self.workers, book_path=self.book_path, board_size=size)
+        # 两者共用一个引擎，轮流运行：轮到己方时SearchWorker搜索，对方思考时Ponderer预先计算
+        self.worker = SearchWorker(self.engine)
+        self.ponderer = Ponderer(self.engine)
+        self.send('OK')
+
+    def info(self, key, value=''):
+        """INFO：记录时间和内存限制，其余键忽略"""
+        key = key.lower()
+        if key == 'timeout_turn':
+            self.timeout_turn = int(value) / 1000
+        elif key == 'timeout_match':
+            self.timeout_match = int(value) / 1000
+        elif key == 'time_left':
+            self.time_left = int(value) / 1000
+        elif key == 'max_memory':
+            self.max_memory = int(value)
+
+    def read_board_line(self, line):
+        """BOARD块中的一行：DONE结束并开始思考，否则为x,y,归属"""
+        if line.upper() == 'DONE':
+            fields, self.board_fields = self.board_fields, None
+            self.set_board(fields)
+            self.play()
+            return
+        try:
+            row, col = parse_move(line, self.board.size)
+            field = int(line.split(',')[2])
+        except (IndexError, ValueError) as error:
+            self.send(f'ERROR {error}')
+            return
+        if field in (FIELD_OWN, FIELD_OPPONENT):
+            self.board_fields.append((row, col, field))
+
+    def set_board(self, fields):
+        """按BOARD给出的局面重新摆棋：轮到己方走，所以双方棋子数相等时己方是先手的黑方"""
+        self.board.reset()
+        own = COLORS[len(fields) % 2]
+        opponent = COLORS[1 - len(fields) % 2]
+        for row, col, field in fields:
+            self.board.place(row, col, own if field == FIELD_OWN else opponent)
+
+    def turn(self, row, col):
+        """TURN：对方落子，猜中时直接取预先算好（或正在算）的应手"""
+        if self.board.get(row, col) is not None:
+            self.stop_pondering()
+            raise ValueError(f'{format_move(row, col)} is occupied')
+        self.board.place(row, col, COLORS[self.board.count % 2])
+        self.ponderer.play(row, col)
+        self.ponderer.wait()
+        hit, move = self.ponderer.poll()
+        if hit:
+            self.reply(move, self.ponderer.stats, 'ponder hit')
+        else:
+            self.play()
+
+    def move_time(self):
+        """这一手可用的秒数：单步限时与整局剩余时间按MOVES_TO_GO平摊后取较小者，再减去余量"""
+        budget = AI_TIME_LIMIT if self.timeout_turn is None else self.timeout_turn
+        if self.timeout_match and self.time_left is not None:
+            budget = min(budget, self.time_left / MOVES_TO_GO)
+        return max(MIN_MOVE_TIME, budget - TIME_MARGIN)
+
+    def set_limits(self):
+        """按当前的时间和内存限制设置引擎，调用时引擎必须空闲"""
+        self.engine.set_memory_limit(self.max_memory)
+        # 算杀按THREAT_SHARE从这一手的时间里分出，不再受默认的单次算杀上限约束
+        self.engine.threat_time_limit = float('inf')
+        self.engine.time_limit = self.move_time()
+
+    def play(self):
+        """轮到己方：搜索并回复一手"""
+        self.set_limits()
+        self.worker.start(self.board, COLORS[self.board.count % 2])
+        _, move = self.worker.wait()
+        self.reply(move, self.engine.search_stats)
+
+    def reply(self, move, stats, note=None):
+        """落下己方着法并回复，然后在对方思考期间预先计算对方可能着法的应手"""
+        if move is None:
+            self.send('ERROR no legal move')
+            return
+        stats = format_search_stats(stats)
+        self.send(f'MESSAGE {stats}, {note}' if note else f'MESSAGE {stats}')
+        color = COLORS[self.board.count % 2]
+        self.board.place(*move, color)
+        self.send(format_move(*move))
+        if self.ponder:
+            self.set_limits()
+            self.ponderer.start(self.board, color)
+
+    def stop_pondering(self):
+        """局面被改动时中止后台搜索和预先计算"""
+        if self.worker is not None:
+            self.worker.cancel()
+            self.ponderer.cancel()
+
+    def close(self):
+        """中止后台搜索并关闭引擎"""
+        self.stop_pondering()
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+
+def main(argv=None):
+    """命令行入口：由Piskvork等对局管理程序启动，通过标准输入输出通信"""
+    parser = argparse.ArgumentParser(description='Five in a Row engine speaking the Piskvork protocol')
+    parser.add_argument('--no-ponder', action='store_true', help="do not search on the opponent's time")
+    parser.add_argument('-j', '--workers', type=int, default=SEARCH_WORKERS,
+                        help='search processes used for root-parallel search')
+    parser.add_argument('--no-book', action='store_true', help='play without the opening book')
+    args = parser.parse_args(argv)
+
+    brain = PiskvorkBrain(sys.stdout, not args.no_ponder, args.workers, None if args.no_book else BOOK_PATH)
+    try:
+        for line in iter(sys.stdin.readline, ''):
+            if not brain.handle(line):
+                break
+    finally:
+        brain.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""无界面自我对弈：多进程并行下N盘AI对AI，每盘结果作为一行JSON输出"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from gobang_engine import (AI_TIME_LIMIT, BOARD_SIZE, BOOK_PATH, SEARCH_DEPTH, THREAT_TIME_LIMIT, Engine,
+                           check_draw, check_proof_size, check_win)
+
+def play_game(game, seed, time_limit=AI_TIME_LIMIT, max_depth=SEARCH_DEPTH,
+              threat_time_limit=THREAT_TIME_LIMIT, book_path=BOOK_PATH, proof_path=None, board_size=BOARD_SIZE):
+    """下一盘自我对弈，黑白双方各用一个引擎，返回对局记录；proof_path为共用的算杀证明缓存文件"""
+    engines = {
+        color: Engine(time_limit=time_limit, max_depth=max_depth, seed=f'{seed}-{color}',
+                      threat_time_limit=threat_time_limit, book_path=book_path, proof_path=proof_path,
+                      board_size=board_size)
+        for color in ('black', 'white')
+    }
+    board = engines['black'].board
+    record = {'game': game, 'seed': seed, 'winner': None, 'moves': [], 'times': [], 'nodes': [], 'depths': []}
+    current_player = 'black'
+    start_time = time.perf_counter()
+
+    while True:
+        engine = engines[current_player]
+        move = engine.get_ai_move(current_player)
+        stats = engine.search_stats
+        if move is None:
+            break
+        row, col = move
+        # 两个引擎的棋盘都要同步这一手
+        for side in engines.values():
+            side.board.place(row, col, current_player)
+        record['moves'].append([row, col])
+        record['times'].append(round(stats['time'], 4))
+        record['nodes'].append(stats['nodes'] + stats['threat_nodes'])
+        record['depths'].append(stats['depth'])
+
+        if check_win(board, row, col):
+            record['winner'] = current_player
+            break
+        if check_draw(board):
+            break
+        current_player = 'white' if current_player == 'black' else 'black'
+
+    record['seconds'] = round(time.perf_counter() - start_time, 3)
+    for engine in engines.values():
+        engine.close()
+    return record
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='Headless Five in a Row self-play')
+    parser.add_argument('-n', '--games', type=int, default=10, help='number of games to play')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='games played in parallel (one process each)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; game i uses seed + i')
+    parser.add_argument('--time-limit', type=float, default=AI_TIME_LIMIT, help='seconds per AI move')
+    parser.add_argument('--max-depth', type=int, default=SEARCH_DEPTH, help='maximum search depth')
+    parser.add_argument('--threat-time-limit', type=float, default=THREAT_TIME_LIMIT,
+                        help='seconds per VCF/VCT solve; raise it together with --time-limit '
+                             'so that only depth and node limits apply and games replay exactly')
+    parser.add_argument('--no-book', action='store_true', help='play without the opening book')
+    parser.add_argument('--board-size', type=int, default=BOARD_SIZE,
+                        help='board size; boards above 32x32 use sparse storage')
+    parser.add_argument('--proof-cache', metavar='FILE',
+                        help='VCF/VCT proof cache loaded before and merged back after every game')
+    parser.add_argument('-o', '--output', default='-', help='JSONL output file, - for stdout')
+    args = parser.parse_args(argv)
+    if args.proof_cache is not None:
+        try:
+            check_proof_size(args.board_size)
+        except ValueError as error:
+            parser.error(str(error))
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    wins = {'black': 0, 'white': 0, None: 0}
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(play_game, game, args.seed + game, args.time_limit, args.max_depth,
+                                       args.threat_time_limit, None if args.no_book else BOOK_PATH,
+                                       args.proof_cache, args.board_size)
+                       for game in range(args.games)]
+            # 每下完一盘立即写出一行，长时间运行时中途也能看到结果
+            for future in as_completed(futures):
+                record = future.result()
+                wins[record['winner']] += 1
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"{args.games} games in {time.perf_counter() - start_time:.1f}s: "
+          f"black {wins['black']}, white {wins['white']}, draw {wins[None]}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()